@@ -0,0 +1,326 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "robot_backend"))
+from acquisition import AcquisitionStats, AcquisitionThread
+from ads1299 import SAMPLE_RATE, decode_daisy_frames, encode_frames, uv_to_codes
+from connectbluetooth import DEFAULT_MTU, pack_packet, pack_sample, samples_per_packet
+from decision import DecisionEngine
+from eeg_devices import ReplayDevice, SyntheticDevice
+from inference import BatchedInference
+from inference_worker import WORKER_MODES, InferenceWorker, predictor_factory
+from model_registry import REGISTRY, create_predictor, get_spec
+from ring_buffer import EEGRingBuffer
+
+BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# 结果格式版本，字段含义改变时递增
+SCHEMA_VERSION = 1
+
+
+def _percentiles(seconds, prefix="latency_ms"):
+    ms = 1000.0 * np.asarray(seconds, dtype=np.float64)
+    return {
+        f'{prefix}_p50': float(np.percentile(ms, 50)),
+        f'{prefix}_p95': float(np.percentile(ms, 95)),
+        f'{prefix}_p99': float(np.percentile(ms, 99)),
+        f'{prefix}_max': float(ms.max()),
+    }
+
+
+def _timeit(fn, min_time=0.2, min_repeat=20, warmup=3):
+    # 重复调用 fn 至少 min_time 秒且至少 min_repeat 次，返回每次的耗时
+    for _ in range(warmup):
+        fn()
+    timings = []
+    start = time.perf_counter()
+    while len(timings) < min_repeat or time.perf_counter() - start < min_time:
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def synthetic_frames(n, seed=0):
+    """n 个样本的原始帧 (两片 ADS1299 首尾相接)"""
+    samples = np.random.default_rng(seed).normal(0.0, 50.0, (n, 16))
+    return encode_frames(uv_to_codes(samples))
+
+
+def bench_decode(n_frames=25000):
+    """
+    原始帧解码吞吐量 (帧/秒)
+
+    bulk: decode_daisy_frames 一次解码整段数据 (回放、离线)
+    acquisition: AcquisitionThread 逐帧读取、检查状态头、解码并写入环形缓冲区 (实时路径)
+    """
+    frames = synthetic_frames(n_frames)
+    timings = _timeit(lambda: decode_daisy_frames(frames), min_repeat=5)
+    result = {'frames': n_frames, 'bulk_frames_per_s': n_frames / float(np.median(timings))}
+
+    ring = EEGRingBuffer(n_frames)
+    device = ReplayDevice(frames, realtime=False)
+    acquisition = AcquisitionThread(device, ring.write, stats=AcquisitionStats(ring.stats))
+    t0 = time.perf_counter()
+    acquisition.start()
+    acquisition.finished.wait()
+    elapsed = time.perf_counter() - t0
+    acquisition.stop()
+    result['acquisition_frames_per_s'] = acquisition.samples / elapsed
+    return result
+
+
+def bench_ble(n_samples=2000):
+    """EEGRecorderBLE 的打包速率: latest 每个通知一个样本 (48 字节)，stream 按默认 MTU 每个通知多个样本"""
+    samples = np.random.default_rng(0).normal(0.0, 50.0, (n_samples, 16)).astype(np.float32)
+
+    def pack_all():
+        for sample in samples:
+            pack_sample(sample)
+
+    size = samples_per_packet(DEFAULT_MTU)
+
+    def pack_packets():
+        for start in range(0, n_samples, size):
+            pack_packet(start, start * 4000, samples[start:start + size])
+
+    timings = _timeit(pack_all, min_repeat=3)
+    per_sample = float(np.median(timings)) / n_samples
+    packet_timings = _timeit(pack_packets, min_repeat=3)
+    per_packet_sample = float(np.median(packet_timings)) / n_samples
+    return {'samples_per_s': 1.0 / per_sample, 'us_per_sample': 1e6 * per_sample,
+            'stream_samples_per_packet': size, 'stream_samples_per_s': 1.0 / per_packet_sample}
+
+
+def random_weights(model_dir):
+    """
+    把随机初始化的模型参数保存为 <model_dir>/<模型类型>.pth
+
+    延迟与参数数值无关，没有训练好的权重时用于测量。
+    """
+    import torch
+
+    torch.manual_seed(0)
+    paths = {}
+    for name, spec in REGISTRY.items():
+        path = os.path.join(model_dir, f"{name}.pth")
+        torch.save(spec.model_class()().state_dict(), path)
+        paths[name] = path
+    return paths
+
+
+def bench_inference(model_paths, backends=None, batch_sizes=BATCH_SIZES, min_time=0.2):
+    """
+    每种模型、每个后端在各批大小下一次前向计算的延迟分位数
+
+    Returns:
+        {模型类型: {后端: {批大小: 结果}}}；不可用的后端 (例如没有安装 onnxruntime) 记录 error
+    """
+    rng = np.random.default_rng(0)
+    results = {}
+    for model_type, path in model_paths.items():
+        results[model_type] = {}
+        for backend in get_spec(model_type).backends:
+            if backends and backend not in backends:
+                continue
+            try:
+                predict = create_predictor(path, model_type, backend)[0]
+            except (ImportError, RuntimeError) as e:
+                # 缺少 onnx / onnxruntime 时导出或加载失败
+                results[model_type][backend] = {'error': str(e)}
+                continue
+            by_batch = {}
+            for batch_size in batch_sizes:
+                batch = rng.normal(0.0, 50.0, (batch_size, 16)).astype(np.float32)
+                timings = _timeit(lambda: predict(batch), min_time=min_time)
+                r = _percentiles(timings)
+                r['samples_per_s'] = batch_size / float(np.median(timings))
+                by_batch[str(batch_size)] = r
+            results[model_type][backend] = by_batch
+    return results
+
+
+def bench_end_to_end(model_path, model_type, backend=None, duration=10.0, worker_mode="thread", batch_size=32,
+                     max_wait_ms=20.0):
+    """
+    样本到判断的端到端延迟
+
+    模拟的 250 SPS 实时采集 -> 环形缓冲区 -> 凑批 -> 推理执行器 -> DecisionEngine；
+    每个样本的延迟 = 该样本的判断更新完成时刻 - 采集时间戳。
+    """
+    ring = EEGRingBuffer(10 * SAMPLE_RATE)
+    device = SyntheticDevice(seed=0)
+    acquisition = AcquisitionThread(device, ring.write, stats=AcquisitionStats(ring.stats))
+    reader = ring.reader()
+    engine = BatchedInference(max_batch=batch_size, max_wait_ms=max_wait_ms)
+    decisions = DecisionEngine()
+    latencies = []
+
+    def on_result(index, timestamps, probs):
+        decisions.update(probs, index, timestamps)
+        latencies.append(time.monotonic() - timestamps)
+
+    worker = InferenceWorker(predictor_factory(model_path, model_type, backend), on_result, mode=worker_mode)
+    worker.start()
+    device.start()
+    acquisition.start()
+    deadline = time.monotonic() + duration
+    try:
+        while time.monotonic() < deadline:
+            n = engine.collect(reader, timeout=0.1)
+            if n:
+                worker.submit(engine.index[:n], engine.timestamps[:n], engine.batch[:n])
+    finally:
+        acquisition.stop()
+        worker.stop()
+
+    stats = acquisition.stats.snapshot()
+    result = {
+        'model': model_type,
+        'backend': worker.backend,
+        'worker': worker_mode,
+        'batch_size': batch_size,
+        'max_wait_ms': max_wait_ms,
+        'samples': int(sum(len(x) for x in latencies)),
+        'dropped_batches': worker.dropped,
+        'acquisition_drop_rate': stats['drop_rate'],
+    }
+    result.update(_percentiles(np.concatenate(latencies)))
+    return result
+
+
+def environment():
+    """结果对应的代码版本和运行环境"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    env = {
+        'schema': SCHEMA_VERSION,
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+    }
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        env['torch'] = torch.__version__
+    return env
+
+
+def _flatten(d, prefix=""):
+    out = {}
+    for key, value in d.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            out.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[name] = value
+    return out
+
+
+def compare(baseline, current, min_change=0.05):
+    """
+    比较两次结果中相同的数值指标
+
+    Returns:
+        [(指标, 基准值, 当前值, 相对变化)]，只包含相对变化超过 min_change 的指标
+    """
+    old, new = _flatten(baseline), _flatten(current)
+    rows = []
+    for name in sorted(old.keys() & new.keys()):
+        if name.startswith('environment.') or not old[name]:
+            continue
+        change = new[name] / old[name] - 1.0
+        if abs(change) >= min_change:
+            rows.append((name, old[name], new[name], change))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="解码、推理和端到端延迟基准测试 (不需要硬件)，结果保存为 JSON")
+    parser.add_argument("--output", help="结果 JSON 文件，默认为 benchmark-<commit>.json")
+    parser.add_argument("--model-dir", help="包含 <模型类型>.pth 的目录，默认使用随机初始化的参数")
+    parser.add_argument("--models", nargs="+", choices=list(REGISTRY), default=list(REGISTRY))
+    parser.add_argument("--backends", nargs="+", help="只测试这些推理后端")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=list(BATCH_SIZES))
+    parser.add_argument("--min-time", type=float, default=0.2, help="每个配置至少测量的时间 (秒)")
+    parser.add_argument("--duration", type=float, default=10.0, help="端到端测试的时间 (秒)")
+    parser.add_argument("--e2e-model", default="CNN", choices=list(REGISTRY), help="端到端测试使用的模型")
+    parser.add_argument("--worker", default="thread", choices=WORKER_MODES, help="端到端测试的推理执行方式")
+    parser.add_argument("--skip", nargs="+", default=[], choices=["decode", "ble", "inference", "end_to_end"])
+    parser.add_argument("--compare", help="与之前的结果 JSON 比较，列出变化超过 5%% 的指标")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.model_dir:
+            model_paths = {name: os.path.join(args.model_dir, f"{name}.pth") for name in REGISTRY}
+        elif "inference" in args.skip and "end_to_end" in args.skip:
+            model_paths = {}
+        else:
+            model_paths = random_weights(tmp)
+
+        if "decode" not in args.skip:
+            print("解码吞吐量...")
+            results['decode'] = bench_decode()
+        if "ble" not in args.skip:
+            print("BLE 打包速率...")
+            results['ble'] = bench_ble()
+        if "inference" not in args.skip:
+            print("前向计算延迟...")
+            results['inference'] = bench_inference({m: model_paths[m] for m in args.models}, args.backends,
+                                                   args.batch_sizes, args.min_time)
+        if "end_to_end" not in args.skip:
+            print(f"端到端延迟 ({args.duration} 秒)...")
+            results['end_to_end'] = bench_end_to_end(model_paths[args.e2e_model], args.e2e_model,
+                                                     duration=args.duration, worker_mode=args.worker)
+    results['environment'] = environment()
+
+    output = args.output or f"benchmark-{(results['environment']['commit'] or 'unknown')[:10]}.json"
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"结果已保存到 {output}")
+
+    if 'decode' in results:
+        r = results['decode']
+        print(f"  解码: 整段 {r['bulk_frames_per_s']:,.0f} 帧/秒, 采集线程 {r['acquisition_frames_per_s']:,.0f} 帧/秒")
+    if 'ble' in results:
+        print(f"  BLE 打包: {results['ble']['samples_per_s']:,.0f} 样本/秒")
+        print(f"  BLE 批量打包 ({results['ble']['stream_samples_per_packet']} 样本/通知): "
+              f"{results['ble']['stream_samples_per_s']:,.0f} 样本/秒")
+    for model_type, by_backend in results.get('inference', {}).items():
+        for backend, by_batch in by_backend.items():
+            if 'error' in by_batch:
+                print(f"  {model_type}/{backend}: 不可用 ({by_batch['error']})")
+                continue
+            cells = ", ".join(f"{b}: {r['latency_ms_p50']:.3f}" for b, r in by_batch.items())
+            print(f"  {model_type}/{backend} p50 ms  {cells}")
+    if 'end_to_end' in results:
+        r = results['end_to_end']
+        print(f"  端到端 ({r['model']}/{r['backend']}, {r['worker']}): p50 {r['latency_ms_p50']:.1f} ms, "
+              f"p99 {r['latency_ms_p99']:.1f} ms, 采集丢帧 {r['acquisition_drop_rate']:.2%}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"与 {args.compare} ({(baseline.get('environment', {}).get('commit') or '?')[:10]}) 比较:")
+        for name, old, new, change in compare(baseline, results):
+            print(f"  {name}: {old:.4g} -> {new:.4g} ({change:+.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import hashlib
+import os
+
+import torch
+from torch import nn
+
+from quantize import quantize_model
+
+# 编译流程改变时递增，使旧的缓存失效
+COMPILE_VERSION = 1
+
+
+def _bn_affine(bn):
+    # 推理时 BatchNorm 是逐通道仿射变换 y = scale * x + shift
+    scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+    shift = bn.bias - bn.running_mean * scale
+    return scale, shift
+
+
+def _fold_into_conv(bn, conv):
+    """
+    把 conv 之前的 BN 折叠进 conv 的输入端
+
+    模型中的顺序是 conv -> relu -> bn -> maxpool -> dropout -> 下一层，BN 在 ReLU 之后，
+    不能折叠进前面的卷积；但当 scale 全为正时 maxpool(scale * x + shift) =
+    scale * maxpool(x) + shift，BN 可以向后折叠进下一层的权重。
+    """
+    scale, shift = _bn_affine(bn)
+    if not torch.all(scale > 0):
+        return False
+    conv.bias.data += (conv.weight * shift[None, :, None]).sum(dim=(1, 2))
+    conv.weight.data *= scale[None, :, None]
+    return True
+
+
+def _fold_into_linear(bn, weight, bias, positions):
+    # 下一层把 (channels, positions) 展平后相乘，第 c 个通道对应连续 positions 列
+    scale, shift = _bn_affine(bn)
+    if not torch.all(scale > 0):
+        return False
+    scale = scale.repeat_interleave(positions)
+    shift = shift.repeat_interleave(positions)
+    bias.data += weight @ shift
+    weight.data *= scale[None, :]
+    return True
+
+
+def fold_batchnorm(model, model_type):
+    """
+    把 bn1 / bn2 折叠进紧随其后的 conv2 / fc1 (或 LSTM 输入权重)，被折叠的 BN 替换为 Identity
+
+    Returns:
+        被折叠的 BN 名称列表
+    """
+    folded = []
+    with torch.no_grad():
+        if model_type in ("CNN", "cnnbilstm"):
+            if _fold_into_conv(model.bn1, model.conv2):
+                model.bn1 = nn.Identity()
+                folded.append("bn1")
+        if model_type == "CNN":
+            # pool2 后形状 (batch, 128, 2)，展平后进入 fc1
+            if _fold_into_linear(model.bn2, model.fc1.weight, model.fc1.bias, 2):
+                model.bn2 = nn.Identity()
+                folded.append("bn2")
+        elif model_type == "cnnbilstm":
+            # pool2 后转置为 (batch, 2, 128)，每个时间步的 128 个特征分别进入两个方向的 LSTM
+            lstm = model.lstm1
+            scale, _ = _bn_affine(model.bn2)
+            if torch.all(scale > 0):
+                for suffix in ("", "_reverse"):
+                    _fold_into_linear(model.bn2, getattr(lstm, "weight_ih_l0" + suffix),
+                                      getattr(lstm, "bias_ih_l0" + suffix), 1)
+                model.bn2 = nn.Identity()
+                folded.append("bn2")
+    return folded
+
+
+def compile_model(model, model_type, quantize=False):
+    """
+    折叠 BN、(可选) 动态 int8 量化、脚本化并冻结模型
+
+    Returns:
+        冻结的 torch.jit.ScriptModule，可以直接替换原模型
+    """
+    model.eval()
+    fold_batchnorm(model, model_type)
+    if quantize:
+        model = quantize_model(model)
+    scripted = torch.jit.script(model)
+    return torch.jit.freeze(scripted)
+
+
+def weights_hash(model_path):
+    sha = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def cache_path(model_path, model_type, cache_dir=None, quantize=False):
+    """
+    编译结果的缓存路径，由模型类型、权重哈希、是否量化和 torch 版本决定
+
+    cache_dir 默认为权重文件旁的 .model_cache 目录
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(model_path)), ".model_cache")
+    key = f"{model_type}{'-int8' if quantize else ''}-{weights_hash(model_path)[:16]}-torch{torch.__version__.split('+')[0]}-v{COMPILE_VERSION}"
+    return os.path.join(cache_dir, key + ".pt")
+
+
+def load_compiled(model_path, model_type, build, cache_dir=None, quantize=False):
+    """
+    读取缓存的编译模型，缓存不存在时编译并保存
+
+    Args:
+        model_path: .pth 权重文件
+        model_type: 模型类型
+        build: 无参数的函数，返回已加载权重的 eager 模型 (只在缓存未命中时调用)
+        cache_dir: 缓存目录
+        quantize: 是否做动态 int8 量化
+
+    Returns:
+        (模型, 是否命中缓存)
+    """
+    path = cache_path(model_path, model_type, cache_dir, quantize)
+    if os.path.exists(path):
+        return torch.jit.load(path, map_location='cpu'), True
+
+    compiled = compile_model(build(), model_type, quantize)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 先写临时文件再改名，避免并发启动时读到写了一半的缓存
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.jit.save(compiled, tmp_path)
+    os.replace(tmp_path, path)
+    return compiled, False
@@ -0,0 +1,159 @@
+import numpy as np
+
+SMOOTHING_MODES = ("mean", "ewma")
+
+# 判断结果: 未确定、非压力、压力
+UNKNOWN = None
+UNSTRESS = 0
+STRESS = 1
+
+STATE_NAMES = {UNSTRESS: "unstress", STRESS: "stress"}
+
+
+class DecisionEngine:
+    """
+    把逐样本的 stress 概率平滑为稳定的判断结果，只在结果改变时产生事件
+
+    平滑:
+        mean: 最近 window_size 个概率的滑动平均，用环形数组维护滚动和，每个样本 O(1)
+        ewma: 指数加权平均，alpha 默认为 2 / (window_size + 1)
+    判断:
+        滞回: 平均概率超过 threshold + hysteresis 才倾向 stress，低于 threshold - hysteresis
+            才倾向 unstress，两者之间保持原来的倾向
+        驻留: 新的倾向连续保持 dwell 个样本后才确认为新状态并产生事件
+
+    Args:
+        window_size: 滑动平均的样本数
+        threshold: 判断 stress 的概率阈值
+        smoothing: "mean" 或 "ewma"
+        alpha: EWMA 系数
+        hysteresis: 滞回宽度 (概率)
+        dwell: 确认新状态所需的连续样本数
+    """
+
+    # 每隔这么多个样本用环形数组重新求和，消除滚动和的浮点累积误差
+    RESYNC_INTERVAL = 4096
+
+    def __init__(self, window_size=15, threshold=0.5, smoothing="mean", alpha=None, hysteresis=0.05, dwell=5):
+        if smoothing not in SMOOTHING_MODES:
+            raise ValueError(f"不支持的平滑方式: {smoothing}")
+        self.window_size = window_size
+        self.threshold = threshold
+        self.smoothing = smoothing
+        self.alpha = alpha if alpha is not None else 2.0 / (window_size + 1)
+        self.hysteresis = hysteresis
+        self.dwell = max(1, dwell)
+        self.transitions = 0
+        self.reset()
+
+    def reset(self):
+        """清除平滑状态和判断结果 (例如信号中断之后)"""
+        self._ring = np.zeros(self.window_size, dtype=np.float64)
+        self._sum = 0.0
+        self._ewma = None
+        self.count = 0
+        self.smoothed = None
+        # 最近一次 update 每个样本的平滑概率
+        self.last_smoothed = np.empty(0)
+        self.state = UNKNOWN
+        # 当前倾向及其已连续保持的样本数
+        self._candidate = UNKNOWN
+        self._run = 0
+
+    def _smooth_mean(self, probs):
+        # 第 k 个新样本移出窗口的是 window_size 个样本之前的概率：
+        # 在本批内则取 probs[k - w]，否则取环形数组，尚未填满时为 0
+        w, t, n = self.window_size, self.count, len(probs)
+        k = np.arange(n)
+        old = t + k - w
+        leaving = np.where(k >= w, probs[np.maximum(k - w, 0)], self._ring[old % w])
+        leaving[old < 0] = 0.0
+        sums = self._sum + np.cumsum(probs - leaving)
+        smoothed = sums / np.minimum(t + k + 1, w)
+
+        m = min(n, w)
+        self._ring[np.arange(t + n - m, t + n) % w] = probs[n - m:]
+        self._sum = float(sums[-1])
+        if (t + n) // self.RESYNC_INTERVAL != t // self.RESYNC_INTERVAL:
+            self._sum = float(self._ring.sum())
+        return smoothed
+
+    def _smooth_ewma(self, probs):
+        smoothed = np.empty(len(probs), dtype=np.float64)
+        y = self._ewma
+        alpha = self.alpha
+        for i, p in enumerate(probs.tolist()):
+            y = p if y is None else y + alpha * (p - y)
+            smoothed[i] = y
+        self._ewma = y
+        return smoothed
+
+    def update(self, probs, seqs=None, timestamps=None):
+        """
+        输入一批概率，返回这批样本中发生的状态改变事件
+
+        Args:
+            probs: (n,) stress 概率
+            seqs: 可选的 (n,) 样本序号
+            timestamps: 可选的 (n,) 采集时间戳
+
+        Returns:
+            list: 事件 dict，包含 state ("stress" / "unstress")、previous (之前的状态名，
+                首次确认时为 None)、probability (平滑后的概率)、confidence、seq 和 timestamp
+        """
+        probs = np.asarray(probs, dtype=np.float64).ravel()
+        n = len(probs)
+        if n == 0:
+            self.last_smoothed = probs
+            return []
+        smoothed = self._smooth_mean(probs) if self.smoothing == "mean" else self._smooth_ewma(probs)
+        self.count += n
+        self.smoothed = float(smoothed[-1])
+        self.last_smoothed = smoothed
+
+        # 滞回: 超过上限 / 低于下限时倾向改变，中间区域向前沿用上一次的倾向
+        level = np.full(n, -1, dtype=np.int64)
+        level[smoothed > self.threshold + self.hysteresis] = STRESS
+        level[smoothed < self.threshold - self.hysteresis] = UNSTRESS
+        last = np.maximum.accumulate(np.where(level >= 0, np.arange(n), -1))
+        previous = -1 if self._candidate is UNKNOWN else self._candidate
+        candidate = np.where(last >= 0, level[np.maximum(last, 0)], previous)
+
+        # 按倾向相同的连续段处理，每段在保持 dwell 个样本时确认
+        events = []
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(candidate)) + 1))
+        ends = np.concatenate((starts[1:], [n]))
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            value = int(candidate[start])
+            if value < 0:
+                continue
+            run = self._run if (start == 0 and value == self._candidate) else 0
+            if value != self.state and run < self.dwell <= run + end - start:
+                i = start + self.dwell - run - 1
+                seq = int(seqs[i]) if seqs is not None else self.count - n + i
+                events.append(self._event(value, smoothed[i], seq, timestamps[i] if timestamps is not None else None))
+            self._candidate = value
+            self._run = run + end - start
+        return events
+
+    def _event(self, state, probability, seq, timestamp):
+        previous = self.state
+        self.state = state
+        self.transitions += 1
+        probability = float(probability)
+        return {
+            'state': STATE_NAMES[state],
+            'previous': STATE_NAMES.get(previous),
+            'probability': probability,
+            'confidence': probability if state == STRESS else 1.0 - probability,
+            'seq': seq,
+            'timestamp': float(timestamp) if timestamp is not None else None,
+        }
+
+    def snapshot(self):
+        return {
+            'samples': self.count,
+            'state': STATE_NAMES.get(self.state),
+            'smoothed': self.smoothed,
+            'transitions': self.transitions,
+        }
@@ -0,0 +1,78 @@
+import time
+
+import numpy as np
+
+
+def torch_predictor(model, input_shape):
+    """
+    把 torch 模型包装为 predict(batch) -> stress 概率 的函数
+
+    batch 是 (n, 16) 的 float32 数组，通过 torch.from_numpy 共享内存，不再逐次构造 FloatTensor，
+    再按 input_shape (model_registry.ModelSpec.input_shape) 变形。
+    """
+    import torch
+
+    shape = tuple(input_shape)
+    model.eval()
+
+    def predict(batch):
+        with torch.no_grad():
+            inputs = torch.from_numpy(batch).view(len(batch), *shape)
+            outputs = model(inputs)
+            return torch.softmax(outputs, dim=1)[:, 1].numpy()
+
+    return predict
+
+
+class BatchedInference:
+    """
+    微批收集
+
+    从环形缓冲区读游标收集样本，凑满 max_batch 个或自第一个样本起等待 max_wait_ms 后，
+    整批交给 inference_worker.InferenceWorker 做一次前向计算。批数据写入预分配的缓冲区，
+    同时记录每个样本在环形缓冲区中的序号 (用于 SessionRecorder.set_probabilities) 和采集时间戳。
+
+    Args:
+        channels: 通道数
+        max_batch: 每批最多样本数
+        max_wait_ms: 收到第一个样本后最多再等待的时间 (毫秒)
+    """
+
+    def __init__(self, channels=16, max_batch=32, max_wait_ms=20.0):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.batch = np.empty((max_batch, channels), dtype=np.float32)
+        self.index = np.empty(max_batch, dtype=np.int64)
+        self.timestamps = np.empty(max_batch, dtype=np.float64)
+
+    def collect(self, reader, timeout=1.0):
+        """
+        收集一批样本到 self.batch
+
+        Args:
+            reader: RingReader
+            timeout: 等待第一个样本的超时时间 (秒)
+
+        Returns:
+            收集到的样本数，0 表示超时
+        """
+        n = 0
+        deadline = None
+        while n < self.max_batch:
+            if deadline is None:
+                wait = timeout
+            else:
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    break
+            data, timestamps = reader.read(max_n=self.max_batch - n, timeout=wait)
+            k = len(data)
+            if k == 0:
+                break
+            self.batch[n:n + k] = data
+            self.timestamps[n:n + k] = timestamps
+            self.index[n:n + k] = np.arange(reader.cursor - k, reader.cursor)
+            n += k
+            if deadline is None:
+                deadline = time.monotonic() + self.max_wait
+        return n
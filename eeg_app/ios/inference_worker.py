@@ -0,0 +1,348 @@
+import argparse
+import functools
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "robot_backend"))
+from acquisition import AcquisitionStats, AcquisitionThread, set_thread_affinity
+from async_log import get_logger
+from eeg_devices import SyntheticDevice
+from inference import BatchedInference
+from metrics import METRICS
+from model_registry import REGISTRY, create_predictor
+from ring_buffer import EEGRingBuffer
+
+WORKER_MODES = ("inline", "thread", "process")
+
+STAGE_HELP = "实时预测每批各阶段的耗时"
+
+# 等待执行器加载模型的默认时间 (秒)，编译或首次转换模型时可能需要较长时间
+START_TIMEOUT = 120.0
+
+log = get_logger("eeg.inference")
+
+
+def configure_torch(threads=None, interop_threads=None):
+    """设置 torch 的算子内 / 算子间线程数；torch 未被导入 (非 torch 后端) 时什么也不做"""
+    torch = sys.modules.get('torch')
+    if torch is None:
+        return
+    if threads:
+        torch.set_num_threads(threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # 算子间线程池启动后不能再修改
+            log.warning("⚠️ 无法设置 torch 算子间线程数，线程池已启动", interop_threads=interop_threads)
+
+
+def predictor_factory(model_path, model_type, backend=None, compiled=False, quantize=False, cache_dir=None):
+    """InferenceWorker 使用的工厂函数，参数和返回值 (predict, 实际使用的后端) 同 model_registry.create_predictor"""
+    return functools.partial(create_predictor, model_path, model_type, backend, compiled, quantize, cache_dir)
+
+
+def _serve(factory, inputs, outputs, status, cpus, threads, interop_threads):
+    # 推理线程 / 进程入口，先绑核再创建模型，torch 之后创建的线程池继承同样的 CPU 集合
+    # outputs(样本序号, 时间戳, 概率, 推理耗时) 是结果回调 (线程) 或写入结果队列 (进程)
+    # status 收到一次加载结果 (错误信息, 后端): 成功时错误信息为 None，失败时只传递文本 (异常对象不一定能跨进程传递)
+    set_thread_affinity(cpus)
+    try:
+        predict, backend = factory()
+        configure_torch(threads, interop_threads)
+    except Exception as e:
+        status.put((f"{type(e).__name__}: {e}", None))
+        return
+    status.put((None, backend))
+    while True:
+        item = inputs.get()
+        if item is None:
+            return
+        index, timestamps, batch = item
+        start = time.perf_counter()
+        probs = predict(batch)
+        outputs(index, timestamps, probs, time.perf_counter() - start)
+
+
+def _serve_process(*args):
+    # 终端的 Ctrl+C 发给整个进程组；推理进程由 stop() 的结束标记停止，忽略 SIGINT 以便排队的批算完
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _serve(*args)
+
+
+def _put_result(outputs, *result):
+    # 在推理进程中调用
+    outputs.put(result)
+
+
+class InferenceWorker:
+    """
+    推理执行器
+
+    mode:
+        inline:  在调用线程中直接计算 (与原来相同)
+        thread:  独立线程，torch / numpy 的计算释放 GIL，不阻塞采集和读取
+        process: 独立进程，完全不与采集、BLE 推送争用 GIL
+
+    输入通过容量为 queue_size 的有界队列传给执行器；队列满时丢弃最旧的一批，
+    使延迟有上限而不是无限堆积 (计入 dropped)。每批的结果一算完就交给
+    on_result(样本序号, 时间戳, 概率)：inline 在 submit 中调用，thread 在推理线程中调用，
+    process 在本进程的结果接收线程中调用，同一时刻只有一个线程调用 on_result。
+    每批的计算耗时记录在 eeg_stage_seconds{stage="inference"} 直方图中 (process 模式下也在本进程)。
+
+    Args:
+        factory: 无参数函数，返回 (predict(batch) -> 概率, 后端名)；在执行器线程 / 进程中调用，
+            实际使用的后端在 start() 之后记录在 self.backend
+        on_result: 结果回调
+        mode: "inline"、"thread" 或 "process"
+        cpus: 推理绑定的 CPU 核
+        threads: torch.set_num_threads
+        interop_threads: torch.set_num_interop_threads
+        queue_size: 输入队列容量 (批数)
+    """
+
+    def __init__(self, factory, on_result, mode="inline", cpus=None, threads=None, interop_threads=None,
+                 queue_size=4):
+        if mode not in WORKER_MODES:
+            raise ValueError(f"不支持的推理执行方式: {mode}")
+        self.on_result = on_result
+        self.mode = mode
+        self.submitted = 0
+        self.samples = 0
+        self.dropped = 0
+        self._args = (factory, cpus, threads, interop_threads)
+        self.backend = None
+        self._runner = None
+        self._listener = None
+        self.inference_seconds = METRICS.histogram("eeg_stage_seconds", STAGE_HELP, stage="inference")
+        if mode == "thread":
+            self._inputs = queue.Queue(queue_size)
+            self._status = queue.Queue()
+        elif mode == "process":
+            self._inputs = multiprocessing.Queue(queue_size)
+            self._outputs = multiprocessing.Queue()
+            self._status = multiprocessing.Queue()
+
+    def start(self, timeout=START_TIMEOUT):
+        """
+        启动执行器并等待模型加载完成
+
+        模型加载失败或 timeout 秒内没有完成时停止执行器并抛出 RuntimeError。
+        """
+        factory, cpus, threads, interop_threads = self._args
+        if self.mode == "inline":
+            set_thread_affinity(cpus)
+            self._predict, self.backend = factory()
+            configure_torch(threads, interop_threads)
+            return
+        if self.mode == "thread":
+            args = (factory, self._inputs, self._deliver, self._status, cpus, threads, interop_threads)
+            self._runner = threading.Thread(target=_serve, args=args, name="inference-worker", daemon=True)
+        else:
+            # 传给子进程的只有模块级函数和队列，不带上本对象和 on_result (spawn 启动方式也可用)
+            outputs = functools.partial(_put_result, self._outputs)
+            args = (factory, self._inputs, outputs, self._status, cpus, threads, interop_threads)
+            self._runner = multiprocessing.Process(target=_serve_process, args=args, name="inference-worker", daemon=True)
+            self._listener = threading.Thread(target=self._listen, name="inference-results", daemon=True)
+            self._listener.start()
+        self._runner.start()
+        try:
+            error, self.backend = self._status.get(timeout=timeout)
+        except queue.Empty:
+            error = f"模型在 {timeout} 秒内没有加载完成"
+        if error is not None:
+            self._abort()
+            raise RuntimeError(f"推理执行器启动失败: {error}")
+
+    def _abort(self):
+        # 启动失败: 进程直接结束；线程加载出错时已经返回，超时时仍在加载 (daemon 线程随进程退出)
+        if self.mode == "process":
+            self._runner.terminate()
+            self._runner.join()
+            self._outputs.put(None)
+            self._listener.join()
+            self._listener = None
+        self._runner = None
+
+    def _listen(self):
+        while True:
+            result = self._outputs.get()
+            if result is None:
+                return
+            self._deliver(*result)
+
+    def _deliver(self, index, timestamps, probs, seconds):
+        self.inference_seconds.observe(seconds)
+        self.on_result(index, timestamps, probs)
+
+    def submit(self, index, timestamps, batch):
+        """提交一批 (样本序号, 时间戳, (n, 16) 数据)，返回后即可复用缓冲区 (thread / process 会拷贝)"""
+        self.submitted += 1
+        self.samples += len(batch)
+        if self.mode == "inline":
+            start = time.perf_counter()
+            probs = self._predict(batch)
+            self._deliver(index, timestamps, probs, time.perf_counter() - start)
+            return
+        item = (index.copy(), timestamps.copy(), batch.copy())
+        while True:
+            try:
+                self._inputs.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._inputs.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def stop(self, timeout=5.0):
+        if self._runner is None:
+            return
+        # 已排队的批先算完；执行器卡住时清空输入队列，保证结束标记能放进去
+        try:
+            self._inputs.put(None, timeout=timeout)
+        except queue.Full:
+            try:
+                while True:
+                    self._inputs.get_nowait()
+            except queue.Empty:
+                pass
+            self._inputs.put(None)
+        self._runner.join(timeout)
+        self._runner = None
+        if self._listener is not None:
+            self._outputs.put(None)
+            self._listener.join(timeout)
+            self._listener = None
+
+
+def _busy(stop_event):
+    # 模拟 BLE 推送等其它负载: numpy 计算释放 GIL，占满一个核
+    a = np.random.default_rng(0).random((256, 256))
+    while not stop_event.is_set():
+        a = np.tanh(a @ a.T / 256.0)
+
+
+def benchmark(factory, setting, duration=10.0, batch_size=32, max_wait_ms=20.0, load_threads=0,
+              acquisition_cpus=None):
+    """
+    在模拟的 250 SPS 实时采集上测量一种执行器配置的端到端延迟
+
+    延迟 = 结果返回时刻 - 批内最早样本的采集时间戳 (包含凑批等待和排队)。
+
+    Args:
+        factory: 同 InferenceWorker
+        setting: InferenceWorker 的参数 dict
+        load_threads: 额外的占用 CPU 的线程数，模拟 BLE 推送等负载
+
+    Returns:
+        dict: 延迟分位数 (毫秒)、丢弃的批数和采集统计
+    """
+    ring = EEGRingBuffer(10 * SyntheticDevice.sample_rate)
+    device = SyntheticDevice(seed=0)
+    acquisition = AcquisitionThread(device, ring.write, stats=AcquisitionStats(ring.stats), cpus=acquisition_cpus)
+    reader = ring.reader()
+    engine = BatchedInference(max_batch=batch_size, max_wait_ms=max_wait_ms)
+    latencies = []
+    worker = InferenceWorker(factory, lambda index, timestamps, probs: latencies.append(time.monotonic() - timestamps[0]),
+                             **setting)
+    worker.start()
+
+    stop_load = threading.Event()
+    load = [threading.Thread(target=_busy, args=(stop_load,), daemon=True) for _ in range(load_threads)]
+    for t in load:
+        t.start()
+
+    device.start()
+    acquisition.start()
+    deadline = time.monotonic() + duration
+    try:
+        while time.monotonic() < deadline:
+            n = engine.collect(reader, timeout=0.1)
+            if n:
+                worker.submit(engine.index[:n], engine.timestamps[:n], engine.batch[:n])
+    finally:
+        acquisition.stop()
+        worker.stop()
+        stop_load.set()
+        for t in load:
+            t.join()
+
+    latencies = 1000.0 * np.array(latencies)
+    stats = acquisition.stats.snapshot()
+    return {
+        'batches': len(latencies),
+        'dropped_batches': worker.dropped,
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p95': float(np.percentile(latencies, 95)),
+        'latency_ms_p99': float(np.percentile(latencies, 99)),
+        'latency_ms_max': float(latencies.max()),
+        'acquisition_drop_rate': stats['drop_rate'],
+        'acquisition_jitter_ms_max': stats['jitter_max_ms'],
+    }
+
+
+def parse_cpus(text):
+    """"2,3" 或 "2-3" -> {2, 3}"""
+    if not text:
+        return None
+    cpus = set()
+    for part in text.split(','):
+        if '-' in part:
+            lo, hi = part.split('-')
+            cpus.update(range(int(lo), int(hi) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def parse_setting(text):
+    """
+    "模式[:torch线程数[:CPU 核]]" -> InferenceWorker 参数，例如 "thread:1:2-3"
+    """
+    parts = text.split(':')
+    setting = {'mode': parts[0]}
+    if len(parts) > 1 and parts[1]:
+        setting['threads'] = int(parts[1])
+    if len(parts) > 2:
+        setting['cpus'] = parse_cpus(parts[2])
+    return setting
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较推理执行器配置在实时采集下的延迟")
+    parser.add_argument("--model", required=True, help="模型文件")
+    parser.add_argument("--type", default="CNN", choices=list(REGISTRY), help="模型类型")
+    parser.add_argument("--backend", help="推理后端，默认使用模型注册的首选后端")
+    parser.add_argument("--settings", nargs="+", default=["inline", "thread:1", "process:1"],
+                        help="执行器配置，格式 模式[:torch线程数[:CPU 核]]，例如 thread:1:2-3")
+    parser.add_argument("--duration", type=float, default=10.0, help="每种配置的测量时间 (秒)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=20.0)
+    parser.add_argument("--load", type=int, default=0, help="额外占用 CPU 的线程数")
+    parser.add_argument("--acquisition-cpus", help="采集线程绑定的 CPU 核，例如 0")
+    args = parser.parse_args()
+
+    factory = predictor_factory(args.model, args.type, args.backend)
+    print(f"{args.type} 模型, 每批最多 {args.batch_size} 个样本 / {args.max_wait_ms} ms, "
+          f"额外负载 {args.load} 线程, 每种配置 {args.duration} 秒")
+    print(f"{'配置':<16}{'批数':>6}{'丢弃':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'采集丢帧':>10}")
+    for text in args.settings:
+        r = benchmark(factory, parse_setting(text), args.duration, args.batch_size, args.max_wait_ms, args.load,
+                      parse_cpus(args.acquisition_cpus))
+        print(f"{text:<16}{r['batches']:>6}{r['dropped_batches']:>6}{r['latency_ms_p50']:>9.2f}"
+              f"{r['latency_ms_p95']:>9.2f}{r['latency_ms_p99']:>9.2f}{r['latency_ms_max']:>9.2f}"
+              f"{r['acquisition_drop_rate']:>10.2%}")
+    print("延迟单位: 毫秒 (结果返回时刻 - 批内最早样本的采集时间)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import os
+import threading
+
+# 推理后端: torch (PyTorch)、onnx (ONNX Runtime CPU)、numpy (仅 StressCNN)
+BACKENDS = ("torch", "onnx", "numpy")
+
+
+class ModelSpec:
+    """
+    一种模型的注册信息
+
+    Args:
+        name: 模型类型名 (real_time_prediction 的 model_type)
+        class_name: models 模块中的类名，只有选用 torch / onnx 后端时才导入
+        input_shape: 单个样本的输入形状 (不含 batch 维)，各后端的 predict 把 (n, 16) 的批数据按此 reshape
+        backends: 支持的推理后端
+        preferred_backend: 未指定后端时使用的后端
+    """
+
+    def __init__(self, name, class_name, input_shape, backends=("torch", "onnx"), preferred_backend="torch"):
+        self.name = name
+        self.class_name = class_name
+        self.input_shape = tuple(input_shape)
+        self.backends = tuple(backends)
+        self.preferred_backend = preferred_backend
+
+    def model_class(self):
+        import models
+
+        return getattr(models, self.class_name)
+
+
+REGISTRY = {}
+
+
+def register(spec):
+    REGISTRY[spec.name] = spec
+    return spec
+
+
+# CNN / CNN-BiLSTM: (channels=1, features=16)，即原来的 unsqueeze(0).unsqueeze(0)
+# Transformer: (seq_len=16, feature_dim=1)，即原来的 view(1, 16, 1)
+register(ModelSpec("CNN", "StressCNN", (1, 16), backends=BACKENDS, preferred_backend="numpy"))
+register(ModelSpec("cnnbilstm", "StressCNNBiLSTM", (1, 16)))
+register(ModelSpec("Transformer", "StressTransformer", (16, 1)))
+
+
+def get_spec(model_type):
+    try:
+        return REGISTRY[model_type]
+    except KeyError:
+        raise ValueError(f"不支持的模型类型: {model_type}")
+
+
+# (绝对路径, mtime) -> state dict。文件被替换 (mtime 变化) 后自动重新读取，
+# 长时间运行的服务切换回用过的模型时不再读盘
+_weights_cache = {}
+_weights_lock = threading.Lock()
+
+
+def load_weights(model_path):
+    """读取 .pth 的 state dict，按路径和修改时间缓存在内存中"""
+    import torch
+
+    path = os.path.abspath(model_path)
+    key = (path, os.stat(path).st_mtime_ns)
+    with _weights_lock:
+        state = _weights_cache.get(key)
+        if state is None:
+            state = torch.load(path, map_location=torch.device('cpu'))
+            # 同一路径只保留最新版本
+            for old in [k for k in _weights_cache if k[0] == path]:
+                del _weights_cache[old]
+            _weights_cache[key] = state
+    return state
+
+
+def clear_weights_cache():
+    with _weights_lock:
+        _weights_cache.clear()
+
+
+def load_model(model_path, model_type):
+    """按模型类型构建 torch 模型并加载 .pth 参数 (eval 模式)"""
+    model = get_spec(model_type).model_class()()
+    model.load_state_dict(load_weights(model_path))
+    model.eval()
+    return model
+
+
+def create_predictor(model_path, model_type, backend=None, compiled=False, quantize=False, cache_dir=None):
+    """
+    按注册信息创建 predict(batch) -> stress 概率
+
+    只有 torch 后端 (或需要把 .pth 转换为 .onnx / .npz) 时才导入 torch。
+
+    Args:
+        model_path: .pth 权重文件；onnx / numpy 后端也可以直接给出 .onnx / .npz 文件
+        model_type: 模型类型
+        backend: 推理后端，默认为该模型的 preferred_backend (compiled / quantize 时默认为 torch)
+        compiled: 使用折叠 BN 后冻结的 TorchScript 模型 (仅 torch)
+        quantize: 动态 int8 量化 (仅 torch)
+        cache_dir: 编译模型的缓存目录
+
+    Returns:
+        (predict, 实际使用的后端)
+    """
+    spec = get_spec(model_type)
+    # compiled / quantize 是 torch 模型上的处理，未指定后端时改用 torch 而不是首选后端
+    backend = backend or ("torch" if compiled or quantize else spec.preferred_backend)
+    if backend not in spec.backends:
+        raise ValueError(f"{model_type} 模型不支持 {backend} 后端 (支持: {', '.join(spec.backends)})")
+    if backend != "torch" and (compiled or quantize):
+        raise ValueError("compiled / quantize 只适用于 torch 后端")
+
+    if backend == "numpy":
+        from numpy_engine import numpy_predictor
+
+        # 参数缓存为 .pth 同名的 .npz，BN 已折叠
+        return numpy_predictor(model_path), backend
+
+    if backend == "onnx":
+        from onnx_backend import load_onnx, onnx_predictor
+
+        # 给出 .pth 时使用同名 .onnx，不存在或已过期则先导出
+        return onnx_predictor(load_onnx(model_path, model_type), spec.input_shape), backend
+
+    from inference import torch_predictor
+
+    if compiled:
+        from compile_model import load_compiled
+
+        # 缓存命中时不再构建 eager 模型和读取 .pth
+        model, _ = load_compiled(model_path, model_type, lambda: load_model(model_path, model_type),
+                                 cache_dir, quantize)
+    else:
+        model = load_model(model_path, model_type)
+        if quantize:
+            from quantize import quantize_model
+
+            model = quantize_model(model)
+    return torch_predictor(model, spec.input_shape), backend
@@ -0,0 +1,194 @@
+import torch.nn as nn
+
+
+class StressCNN(nn.Module):
+    def __init__(self):
+        super(StressCNN, self).__init__()
+
+        # 输入通道 1，输出通道 64，卷积核 3
+        self.conv1 = nn.Conv1d(in_channels=1, out_channels=64, kernel_size=3)
+        self.bn1 = nn.BatchNorm1d(64)
+        self.pool1 = nn.MaxPool1d(kernel_size=2)
+        self.drop1 = nn.Dropout(0.3)
+
+        self.conv2 = nn.Conv1d(in_channels=64, out_channels=128, kernel_size=3)
+        self.bn2 = nn.BatchNorm1d(128)
+        self.pool2 = nn.MaxPool1d(kernel_size=2)
+        self.drop2 = nn.Dropout(0.3)
+
+        self.fc1 = nn.Linear(128 * 2, 128)
+        self.drop3 = nn.Dropout(0.5)
+        self.fc2 = nn.Linear(128, 64)
+        self.drop4 = nn.Dropout(0.5)
+        self.fc3 = nn.Linear(64, 2)  # 最终输出2类
+
+    def forward(self, x):
+        # x shape: (batch_size, 1, 16)
+        x = self.conv1(x)  # -> (batch_size, 64, 14)
+        x = nn.functional.relu(x)
+        x = self.bn1(x)
+        x = self.pool1(x)  # -> (batch_size, 64, 7)
+        x = self.drop1(x)
+
+        x = self.conv2(x)  # -> (batch_size, 128, 5)
+        x = nn.functional.relu(x)
+        x = self.bn2(x)
+        x = self.pool2(x)  # -> (batch_size, 128, 2)
+        x = self.drop2(x)
+
+        # 展平
+        x = x.view(x.size(0), -1)  # -> (batch_size, 128*2)=256
+        x = self.fc1(x)  # -> (batch_size, 128)
+        x = nn.functional.relu(x)
+        x = self.drop3(x)
+
+        x = self.fc2(x)  # -> (batch_size, 64)
+        x = nn.functional.relu(x)
+        x = self.drop4(x)
+
+        x = self.fc3(x)  # -> (batch_size, 2)
+        return x
+
+
+class StressCNNBiLSTM(nn.Module):
+    def __init__(self):
+        super(StressCNNBiLSTM, self).__init__()
+
+        # CNN layers
+        self.conv1 = nn.Conv1d(in_channels=1, out_channels=64, kernel_size=3)
+        self.bn1 = nn.BatchNorm1d(64)  # 添加了BatchNorm
+        self.pool1 = nn.MaxPool1d(kernel_size=2)
+        self.drop1 = nn.Dropout(0.3)
+
+        self.conv2 = nn.Conv1d(in_channels=64, out_channels=128, kernel_size=3)
+        self.bn2 = nn.BatchNorm1d(128)  # 添加了BatchNorm
+        self.pool2 = nn.MaxPool1d(kernel_size=2)
+        self.drop2 = nn.Dropout(0.3)
+
+        # BiLSTM layers
+        # 卷积池化后的特征大小: (batch_size, 128, 2)
+        # 转置后输入LSTM的形状: (batch_size, 2, 128)
+        self.lstm1 = nn.LSTM(128, 64, bidirectional=True, batch_first=True)
+        self.drop3 = nn.Dropout(0.5)
+
+        # Fully connected layers
+        self.fc1 = nn.Linear(64 * 2, 64)  # Flattened LSTM output
+        self.fc2 = nn.Linear(64, 32)
+        self.fc3 = nn.Linear(32, 2)
+
+    def forward(self, x):
+        # CNN forward pass
+        x = self.conv1(x)  # (batch_size, 64, 14)
+        x = nn.functional.relu(x)
+        x = self.bn1(x)  # 添加BatchNorm
+        x = self.pool1(x)  # (batch_size, 64, 7)
+        x = self.drop1(x)
+
+        x = self.conv2(x)  # (batch_size, 128, 5)
+        x = nn.functional.relu(x)
+        x = self.bn2(x)  # 添加BatchNorm
+        x = self.pool2(x)  # (batch_size, 128, 2)
+        x = self.drop2(x)
+
+        # Reshape to (batch_size, sequence_length, feature_size)
+        x = x.permute(0, 2, 1)  # (batch_size, 2, 128)
+
+        # BiLSTM forward pass
+        x, _ = self.lstm1(x)  # (batch_size, 2, 128)
+        x = self.drop3(x)
+
+        # 使用最后一个时间步的输出
+        x = x[:, -1, :]  # (batch_size, 64)
+        x = self.fc1(x)  # (batch_size, 64)
+        x = nn.functional.relu(x)
+        x = self.fc2(x)  # (batch_size, 32)
+        x = nn.functional.relu(x)
+        x = self.fc3(x)  # (batch_size, 2)
+
+        return x
+
+
+# 使用此类如果你使用的是Transformer模型
+class StressTransformer(nn.Module):
+    def __init__(self, input_dim=1, embed_dim=64, num_heads=4, ff_dim=128,
+                 num_transformer_blocks=2, mlp_units=[64], dropout=0.3, mlp_dropout=0.3):
+        super(StressTransformer, self).__init__()
+
+        # 初始特征嵌入层
+        self.embedding = nn.Linear(input_dim, embed_dim)
+
+        # Transformer块
+        self.transformer_blocks = nn.ModuleList([
+            TransformerBlock(embed_dim, num_heads, ff_dim, dropout)
+            for _ in range(num_transformer_blocks)
+        ])
+
+        # MLP分类器
+        layers = []
+        for dim in mlp_units:
+            layers.append(nn.Linear(embed_dim, dim))
+            layers.append(nn.ReLU())
+            layers.append(nn.Dropout(mlp_dropout))
+
+        self.mlp = nn.Sequential(*layers)
+
+        # 输出层
+        self.output_layer = nn.Linear(mlp_units[-1] if mlp_units else embed_dim, 2)
+
+    def forward(self, x):
+        # x的输入形状是(batch_size, seq_len, input_dim)
+
+        # 映射到嵌入空间
+        x = self.embedding(x)  # (batch_size, seq_len, embed_dim)
+
+        # 应用Transformer块
+        for transformer_block in self.transformer_blocks:
+            x = transformer_block(x)
+
+        # 全局平均池化 - 对序列维度进行平均
+        x = x.mean(dim=1)  # (batch_size, embed_dim)
+
+        # MLP分类器
+        x = self.mlp(x)
+
+        # 输出层
+        x = self.output_layer(x)
+
+        return x
+
+
+class TransformerBlock(nn.Module):
+    def __init__(self, embed_dim, num_heads, ff_dim, dropout=0.1):
+        super(TransformerBlock, self).__init__()
+
+        # 多头自注意力机制
+        self.att = nn.MultiheadAttention(embed_dim=embed_dim, num_heads=num_heads, dropout=dropout, batch_first=True)
+
+        # 前馈神经网络
+        self.ffn = nn.Sequential(
+            nn.Linear(embed_dim, ff_dim),
+            nn.ReLU(),
+            nn.Dropout(dropout),
+            nn.Linear(ff_dim, embed_dim)
+        )
+
+        # Layer Normalization
+        self.layernorm1 = nn.LayerNorm(embed_dim)
+        self.layernorm2 = nn.LayerNorm(embed_dim)
+
+        # Dropout
+        self.dropout1 = nn.Dropout(dropout)
+        self.dropout2 = nn.Dropout(dropout)
+
+    def forward(self, x):
+        # 第一个子层：多头自注意力 + 残差连接
+        attn_output, _ = self.att(x, x, x)
+        x = x + self.dropout1(attn_output)
+        x = self.layernorm1(x)
+
+        # 第二个子层：前馈神经网络 + 残差连接
+        ffn_output = self.ffn(x)
+        x = x + self.dropout2(ffn_output)
+        x = self.layernorm2(x)
+
+        return x
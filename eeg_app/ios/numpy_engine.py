@@ -0,0 +1,240 @@
+import argparse
+import os
+
+import numpy as np
+
+# .npz 中参数的格式版本，折叠方式改变时递增
+NPZ_VERSION = 1
+
+
+def default_npz_path(model_path):
+    """与 .pth 同名的 .npz 文件"""
+    return os.path.splitext(model_path)[0] + ".npz"
+
+
+def _bn_affine(params, name):
+    scale = params[f"{name}.weight"] / np.sqrt(params[f"{name}.running_var"] + 1e-5)
+    shift = params[f"{name}.bias"] - params[f"{name}.running_mean"] * scale
+    return scale, shift
+
+
+def fold_state_dict(params):
+    """
+    把 StressCNN 的 state dict (numpy 数组) 转为推理用参数
+
+    BN 在 ReLU 之后、MaxPool 之前 (conv -> relu -> bn -> maxpool)，scale 全为正时
+    与 MaxPool 可交换，因此 bn1 折叠进 conv2、bn2 折叠进 fc1；否则保留为单独的仿射变换。
+    """
+    out = {name: params[name].astype(np.float64) for name in (
+        "conv1.weight", "conv1.bias", "conv2.weight", "conv2.bias",
+        "fc1.weight", "fc1.bias", "fc2.weight", "fc2.bias", "fc3.weight", "fc3.bias")}
+
+    scale, shift = _bn_affine(params, "bn1")
+    if np.all(scale > 0):
+        out["conv2.bias"] += (out["conv2.weight"] * shift[None, :, None]).sum(axis=(1, 2))
+        out["conv2.weight"] *= scale[None, :, None]
+    else:
+        out["bn1.scale"], out["bn1.shift"] = scale, shift
+
+    scale, shift = _bn_affine(params, "bn2")
+    if np.all(scale > 0):
+        # fc1 的输入按 (通道, 位置) 展平，每个通道对应 2 列
+        out["fc1.bias"] += out["fc1.weight"] @ np.repeat(shift, 2)
+        out["fc1.weight"] *= np.repeat(scale, 2)[None, :]
+    else:
+        out["bn2.scale"], out["bn2.shift"] = scale, shift
+
+    out = {k: v.astype(np.float32) for k, v in out.items()}
+    out["version"] = np.array(NPZ_VERSION)
+    return out
+
+
+def convert(model_path, npz_path=None):
+    """把 .pth 转为 .npz (只有这一步需要 torch)"""
+    import torch
+
+    npz_path = npz_path or default_npz_path(model_path)
+    state = torch.load(model_path, map_location='cpu')
+    params = fold_state_dict({k: v.detach().cpu().numpy().astype(np.float64) for k, v in state.items()})
+    # 先写临时文件再改名，避免并发启动时读到写了一半的文件
+    tmp_path = f"{npz_path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, **params)
+    os.replace(tmp_path, npz_path)
+    return npz_path
+
+
+def load_params(model_path):
+    """
+    读取 .pth 对应的 .npz 参数，不存在或比 .pth 旧时重新转换
+
+    model_path 也可以直接是 .npz 文件。
+    """
+    if model_path.endswith(".npz"):
+        npz_path = model_path
+    else:
+        npz_path = default_npz_path(model_path)
+        stale = not os.path.exists(npz_path) or os.path.getmtime(npz_path) < os.path.getmtime(model_path)
+        if not stale:
+            # 早期转换的 .npz 没有 version，同样视为过期
+            with np.load(npz_path) as f:
+                stale = "version" not in f or int(f["version"]) != NPZ_VERSION
+        if stale:
+            convert(model_path, npz_path)
+    with np.load(npz_path) as f:
+        return {k: f[k] for k in f.files}
+
+
+class NumpyStressCNN:
+    """
+    只用 NumPy 的 StressCNN 前向计算 (推理模式，没有 Dropout)
+
+    卷积按 im2col 展开为矩阵乘法，整批输入 (n, 16) 一共 5 次矩阵乘法。
+
+    Args:
+        params: load_params / fold_state_dict 返回的参数
+    """
+
+    def __init__(self, params):
+        self.w1 = params["conv1.weight"].reshape(64, 3).T.copy()  # (3, 64)
+        self.b1 = params["conv1.bias"]
+        # conv2 权重 (128, 64, 3) 按 (核位置, 输入通道) 展开，与 im2col 的顺序一致
+        self.w2 = params["conv2.weight"].transpose(2, 1, 0).reshape(3 * 64, 128).copy()
+        self.b2 = params["conv2.bias"]
+        self.bn1 = (params["bn1.scale"], params["bn1.shift"]) if "bn1.scale" in params else None
+        self.bn2 = (params["bn2.scale"], params["bn2.shift"]) if "bn2.scale" in params else None
+        self.fc = [(params[f"fc{i}.weight"].T.copy(), params[f"fc{i}.bias"]) for i in (1, 2, 3)]
+
+    @staticmethod
+    def _windows(x, k=3):
+        # (n, length, c) -> (n, length - k + 1, k * c)，按 (核位置, 通道) 排列
+        n, length, c = x.shape
+        return np.lib.stride_tricks.sliding_window_view(x, k, axis=1).transpose(0, 1, 3, 2).reshape(n, length - k + 1, k * c)
+
+    @staticmethod
+    def _pool(x):
+        # 核 2 的 MaxPool1d，丢弃末尾多出的一个位置
+        n, length, c = x.shape
+        half = length // 2
+        return x[:, :2 * half].reshape(n, half, 2, c).max(axis=2)
+
+    def logits(self, x):
+        """x: (n, 16) -> (n, 2)"""
+        x = np.asarray(x, dtype=np.float32)
+        n = len(x)
+        h = self._windows(x[:, :, None]) @ self.w1 + self.b1  # (n, 14, 64)
+        np.maximum(h, 0, out=h)
+        if self.bn1 is not None:
+            h = h * self.bn1[0] + self.bn1[1]
+        h = self._pool(h)  # (n, 7, 64)
+
+        h = self._windows(h) @ self.w2 + self.b2  # (n, 5, 128)
+        np.maximum(h, 0, out=h)
+        if self.bn2 is not None:
+            h = h * self.bn2[0] + self.bn2[1]
+        h = self._pool(h)  # (n, 2, 128)
+
+        # 与 torch 的 x.view(n, -1) 一致，按 (通道, 位置) 展平
+        h = h.transpose(0, 2, 1).reshape(n, -1)
+        for i, (w, b) in enumerate(self.fc):
+            h = h @ w + b
+            if i < 2:
+                np.maximum(h, 0, out=h)
+        return h
+
+    def predict(self, x):
+        """返回 (n,) 的 stress 概率"""
+        logits = self.logits(x)
+        return 1.0 / (1.0 + np.exp(logits[:, 0] - logits[:, 1]))
+
+
+def numpy_predictor(model_path):
+    """返回 predict(batch) -> stress 概率，不导入 torch (除非需要把 .pth 转为 .npz)"""
+    return NumpyStressCNN(load_params(model_path)).predict
+
+
+def _compare(model, engine, x):
+    # 最大 logit 差和最大概率差
+    import torch
+
+    with torch.no_grad():
+        expected = model(torch.from_numpy(x).unsqueeze(1)).numpy()
+    prob_expected = torch.softmax(torch.from_numpy(expected), dim=1)[:, 1].numpy()
+    return float(np.abs(engine.logits(x) - expected).max()), float(np.abs(engine.predict(x) - prob_expected).max())
+
+
+def verify(model_path, n=1024, seed=0):
+    """
+    在随机输入上比较 NumPy 引擎与 torch StressCNN 的输出
+
+    Returns:
+        最大 logit 差和最大概率差
+    """
+    from model_registry import load_model
+
+    x = np.random.default_rng(seed).normal(0.0, 50.0, (n, 16)).astype(np.float32)
+    return _compare(load_model(model_path, "CNN"), NumpyStressCNN(load_params(model_path)), x)
+
+
+def self_check(n=1024, seed=0, atol=1e-4):
+    """
+    不需要训练好的 .pth：用随机参数构建 StressCNN，比较 NumPy 引擎与 torch 的 logits
+
+    BN 的统计量也随机设置，分别检查 scale 全为正 (折叠进相邻层) 和含负值 (保留为单独仿射变换)
+    两种情况。任一情况的 logit 差超过 atol 时抛出 AssertionError。
+
+    Returns:
+        dict: 情况 -> (最大 logit 差, 最大概率差)
+    """
+    import torch
+
+    from models import StressCNN
+
+    torch.manual_seed(seed)
+    x = np.random.default_rng(seed).normal(0.0, 50.0, (n, 16)).astype(np.float32)
+    results = {}
+    for case, negative in (("folded", False), ("unfolded", True)):
+        model = StressCNN().eval()
+        with torch.no_grad():
+            for bn in (model.bn1, model.bn2):
+                bn.running_mean.normal_(0.0, 1.0)
+                bn.running_var.uniform_(0.5, 2.0)
+                bn.weight.uniform_(0.5, 1.5)
+                bn.bias.normal_(0.0, 0.5)
+                if negative:
+                    bn.weight[::3] *= -1
+        params = fold_state_dict({k: v.numpy().astype(np.float64) for k, v in model.state_dict().items()})
+        if ("bn1.scale" in params) != negative:
+            raise AssertionError(f"{case}: BN 折叠方式与预期不符")
+        results[case] = _compare(model, NumpyStressCNN(params), x)
+        if results[case][0] > atol:
+            raise AssertionError(f"{case}: NumPy 引擎与 torch 的 logit 最大差 {results[case][0]:.2e} 超过 {atol:.0e}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把 StressCNN 的 .pth 转为 NumPy 推理用的 .npz")
+    parser.add_argument("--model", help="StressCNN 的 .pth 权重文件")
+    parser.add_argument("--check", action="store_true", help="与 torch 模型的输出比较")
+    parser.add_argument("--self-check", action="store_true", help="用随机参数的 StressCNN 检查 NumPy 引擎 (不需要 --model)")
+    args = parser.parse_args()
+    if not args.model and not args.self_check:
+        parser.error("需要 --model 或 --self-check")
+
+    if args.self_check:
+        try:
+            results = self_check()
+        except AssertionError as e:
+            raise SystemExit(f"❌ {e}")
+        for case, (logit_diff, prob_diff) in results.items():
+            print(f"✅ 随机参数 ({case}) 与 torch 的最大差: logit {logit_diff:.2e}, 概率 {prob_diff:.2e}")
+    if args.model:
+        print(f"已转换 {convert(args.model)}")
+        if args.check:
+            logit_diff, prob_diff = verify(args.model)
+            print(f"与 torch 的最大差: logit {logit_diff:.2e}, 概率 {prob_diff:.2e}")
+            if prob_diff > 1e-4:
+                raise SystemExit("NumPy 引擎与 torch 输出不一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import copy
+import inspect
+import os
+
+import numpy as np
+
+from model_registry import REGISTRY, get_spec, load_model
+
+INPUT_NAME = "eeg"
+OUTPUT_NAME = "logits"
+# 导出方式 (BN 折叠、输入输出名等) 改变时加一，旧版本导出的 .onnx 会被重新导出
+ONNX_VERSION = 1
+VERSION_KEY = "export_version"
+
+
+def default_onnx_path(model_path):
+    """与 .pth 同名的 .onnx 文件"""
+    return os.path.splitext(model_path)[0] + ".onnx"
+
+
+def export_onnx(model, model_type, path, opset=17):
+    """
+    把模型导出为 batch 维可变的 ONNX
+
+    导出前先折叠 BN (compile_model.fold_batchnorm)，输入名 eeg，输出名 logits，
+    元数据中记录 ONNX_VERSION。
+    """
+    import onnx
+    import torch
+
+    from compile_model import fold_batchnorm
+
+    model = copy.deepcopy(model).eval()
+    fold_batchnorm(model, model_type)
+    dummy = torch.zeros(1, *get_spec(model_type).input_shape)
+    kwargs = {}
+    # 新版 torch 默认使用依赖 onnxscript 的 dynamo 导出器，这里固定使用 TorchScript 导出器
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        kwargs['dynamo'] = False
+    # nn.MultiheadAttention 推理时的融合快速路径 (_native_multi_head_attention) 没有 ONNX 算子
+    fastpath = torch.backends.mha.get_fastpath_enabled()
+    torch.backends.mha.set_fastpath_enabled(False)
+    try:
+        with torch.no_grad():
+            torch.onnx.export(model, dummy, path, input_names=[INPUT_NAME], output_names=[OUTPUT_NAME],
+                              dynamic_axes={INPUT_NAME: {0: 'batch'}, OUTPUT_NAME: {0: 'batch'}},
+                              opset_version=opset, **kwargs)
+    finally:
+        torch.backends.mha.set_fastpath_enabled(fastpath)
+
+    exported = onnx.load(path)
+    exported.metadata_props.add(key=VERSION_KEY, value=str(ONNX_VERSION))
+    onnx.save(exported, path)
+    return path
+
+
+def export_version(path):
+    """.onnx 元数据中记录的导出版本，没有记录时为 None (只读取模型结构，不创建推理会话)"""
+    import onnx
+
+    props = onnx.load(path, load_external_data=False).metadata_props
+    version = next((p.value for p in props if p.key == VERSION_KEY), None)
+    return int(version) if version is not None else None
+
+
+def load_onnx(model_path, model_type):
+    """
+    返回 .pth 对应的 .onnx 路径，不存在、比 .pth 旧或导出版本不同时重新导出
+
+    model_path 也可以直接是 .onnx 文件。
+    """
+    if model_path.endswith(".onnx"):
+        return model_path
+    onnx_path = default_onnx_path(model_path)
+    stale = not os.path.exists(onnx_path) or os.path.getmtime(onnx_path) < os.path.getmtime(model_path)
+    if not stale:
+        try:
+            stale = export_version(onnx_path) != ONNX_VERSION
+        except ImportError:
+            # 只安装了 onnxruntime 的部署环境无法导出，不检查导出版本
+            pass
+    if stale:
+        export_onnx(load_model(model_path, model_type), model_type, onnx_path)
+    return onnx_path
+
+
+def onnx_predictor(path, input_shape, threads=None):
+    """
+    用 ONNX Runtime CPU provider 加载模型，返回 predict(batch) -> stress 概率
+
+    只导入 onnxruntime 和 numpy，不需要 torch。
+
+    Args:
+        path: .onnx 文件
+        input_shape: 单个样本的输入形状 (model_registry.ModelSpec.input_shape)
+        threads: 算子内线程数，默认由 ONNX Runtime 决定
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+    session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+    shape = tuple(input_shape)
+
+    def predict(batch):
+        logits = session.run([OUTPUT_NAME], {INPUT_NAME: batch.reshape(len(batch), *shape)})[0]
+        # 两类 softmax 的 stress 概率 = sigmoid(logit1 - logit0)
+        return 1.0 / (1.0 + np.exp(logits[:, 0] - logits[:, 1]))
+
+    return predict
+
+
+def main():
+    from inference import torch_predictor
+
+    parser = argparse.ArgumentParser(description="把 .pth 模型导出为 ONNX，并与 torch 的输出比较")
+    parser.add_argument("--model", required=True, help=".pth 权重文件")
+    parser.add_argument("--type", default="cnnbilstm", choices=list(REGISTRY), help="模型类型")
+    parser.add_argument("--output", help="输出的 .onnx 文件，默认与 .pth 同名")
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    output = args.output or default_onnx_path(args.model)
+    model = load_model(args.model, args.type)
+    export_onnx(model, args.type, output, args.opset)
+    print(f"已导出 {output}")
+
+    batch = np.random.default_rng(0).normal(0.0, 50.0, (64, 16)).astype(np.float32)
+    shape = get_spec(args.type).input_shape
+    expected = torch_predictor(model, shape)(batch)
+    actual = onnx_predictor(output, shape)(batch)
+    print(f"与 torch 的最大概率差 (batch=64): {np.abs(expected - actual).max():.2e}")
+
+
+if __name__ == "__main__":
+    main()
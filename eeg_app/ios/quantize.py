@@ -0,0 +1,114 @@
+import argparse
+import copy
+import io
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+import torch
+from torch import nn
+
+from inference import torch_predictor
+from model_registry import REGISTRY, get_spec, load_model
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "robot_backend"))
+from eeg_devices import load_session
+
+# 动态量化的层: StressCNN 的 fc1-fc3、StressCNNBiLSTM 的 LSTM 和全连接层、
+# TransformerBlock 的 FFN。nn.MultiheadAttention 的 in_proj 是裸参数而不是 nn.Linear，
+# out_proj 是不支持动态量化的 Linear 子类，注意力投影保持 fp32
+QUANTIZED_LAYERS = {nn.Linear, nn.LSTM}
+
+
+def quantize_model(model):
+    """
+    对 Linear / LSTM 做动态 int8 量化 (权重 int8，激活在运行时按批量化)
+
+    Returns:
+        量化后的新模型，原模型不变
+    """
+    # 树莓派等 ARM CPU 上只有 qnnpack 有优化的 int8 内核
+    if platform.machine() in ('aarch64', 'arm64', 'armv7l') and 'qnnpack' in torch.backends.quantized.supported_engines:
+        torch.backends.quantized.engine = 'qnnpack'
+    model = copy.deepcopy(model).eval()
+    return torch.ao.quantization.quantize_dynamic(model, QUANTIZED_LAYERS, dtype=torch.qint8)
+
+
+def model_nbytes(model):
+    """模型参数序列化后的字节数"""
+    buf = io.BytesIO()
+    torch.save(model.state_dict(), buf)
+    return buf.tell()
+
+
+def _benchmark(predict, samples, batch_size):
+    # 按 batch_size 分批打分，返回概率和每批耗时
+    probs = np.empty(len(samples), dtype=np.float32)
+    timings = []
+    predict(np.ascontiguousarray(samples[:batch_size]))
+    for i in range(0, len(samples), batch_size):
+        batch = np.ascontiguousarray(samples[i:i + batch_size])
+        t0 = time.perf_counter()
+        probs[i:i + len(batch)] = predict(batch)
+        timings.append(time.perf_counter() - t0)
+    return probs, np.array(timings)
+
+
+def quantization_report(model, model_type, samples, batch_size=32, threshold=0.5):
+    """
+    在一段回放数据上比较 fp32 和动态 int8 模型
+
+    Args:
+        model: 已加载权重的 fp32 模型
+        model_type: 模型类型
+        samples: (n, 16) µV 样本
+        batch_size: 每次前向计算的样本数
+        threshold: 判断 stress 的概率阈值
+
+    Returns:
+        dict: 两种模型每批延迟的中位数 / p95 (毫秒)、参数大小 (字节)，
+            以及分类一致率和概率差
+    """
+    quantized = quantize_model(model)
+    report = {'samples': len(samples), 'batch_size': batch_size}
+    results = {}
+    for name, m in (('fp32', model), ('int8', quantized)):
+        probs, timings = _benchmark(torch_predictor(m, get_spec(model_type).input_shape), samples, batch_size)
+        results[name] = probs
+        report[name] = {
+            'latency_ms_p50': 1000.0 * float(np.median(timings)),
+            'latency_ms_p95': 1000.0 * float(np.percentile(timings, 95)),
+            'param_bytes': model_nbytes(m),
+        }
+    diff = np.abs(results['fp32'] - results['int8'])
+    report['agreement'] = float(np.mean((results['fp32'] > threshold) == (results['int8'] > threshold)))
+    report['prob_diff_mean'] = float(diff.mean())
+    report['prob_diff_max'] = float(diff.max())
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较 fp32 与动态 int8 量化模型的延迟、大小和一致性")
+    parser.add_argument("--model", required=True, help=".pth 权重文件")
+    parser.add_argument("--type", default="cnnbilstm", choices=list(REGISTRY), help="模型类型")
+    parser.add_argument("--replay", required=True, help="回放的记录、归档或原始帧文件")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--limit", type=int, help="只使用前 N 个样本")
+    args = parser.parse_args()
+
+    samples = load_session(args.replay)[:args.limit]
+    report = quantization_report(load_model(args.model, args.type), args.type, samples, args.batch_size)
+
+    print(f"{args.type} 模型, {report['samples']} 个样本, 每批 {report['batch_size']} 个")
+    for name in ('fp32', 'int8'):
+        r = report[name]
+        print(f"  {name}: 每批延迟 p50 {r['latency_ms_p50']:.3f} ms / p95 {r['latency_ms_p95']:.3f} ms, "
+              f"参数 {r['param_bytes'] / 1024:.1f} KiB")
+    print(f"  分类一致率: {report['agreement']:.2%}, "
+          f"概率差 平均 {report['prob_diff_mean']:.4f} / 最大 {report['prob_diff_max']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
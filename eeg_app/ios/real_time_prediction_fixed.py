@@ -1,442 +1,291 @@
-import spidev
+import argparse
+import functools
+import os
+import sys
 import time
-from RPi import GPIO
-import gpiod
-import numpy as np
-import torch
-import torch.nn.functional as F
-import torch.nn as nn
-from collections import deque
-
-# GPIO设置
-GPIO.setwarnings(False)
-GPIO.setmode(GPIO.BOARD)
-
-# 设备配置
-button_pin_1 = 26
-button_pin_2 = 13
-
-chip = gpiod.chip("0")
-cs_line = chip.get_line(19)
-cs_line_out = gpiod.line_request()
-cs_line_out.consumer = "SPI_CS"
-cs_line_out.request_type = gpiod.line_request.DIRECTION_OUTPUT
-cs_line.request(cs_line_out)
-cs_line.set_value(1)
-
-line_1 = chip.get_line(button_pin_1)
-line_2 = chip.get_line(button_pin_2)
-
-button_line_1 = gpiod.line_request()
-button_line_1.consumer = "Button"
-button_line_1.request_type = gpiod.line_request.DIRECTION_INPUT
-line_1.request(button_line_1)
-
-button_line_2 = gpiod.line_request()
-button_line_2.consumer = "Button"
-button_line_2.request_type = gpiod.line_request.DIRECTION_INPUT
-line_2.request(button_line_2)
-
-# SPI初始化
-spi = spidev.SpiDev()
-spi.open(0, 0)
-spi.max_speed_hz = 4000000
-spi.lsbfirst = False
-spi.mode = 0b01
-spi.bits_per_word = 8
-
-spi_2 = spidev.SpiDev()
-spi_2.open(0, 1)
-spi_2.max_speed_hz = 4000000
-spi_2.lsbfirst = False
-spi_2.mode = 0b01
-spi_2.bits_per_word = 8
-
-# SPI命令集
-COMMANDS = {
-    'wakeup': 0x02,
-    'stop': 0x0A,
-    'start': 0x08,
-    'reset': 0x06,
-    'sdatac': 0x11,
-    'rdatac': 0x10,
-    'rdata': 0x12
-}
-
-
-# 加载对应的模型类
-class StressCNN(nn.Module):
-    def __init__(self):
-        super(StressCNN, self).__init__()
-
-        # 输入通道 1，输出通道 64，卷积核 3
-        self.conv1 = nn.Conv1d(in_channels=1, out_channels=64, kernel_size=3)
-        self.bn1 = nn.BatchNorm1d(64)
-        self.pool1 = nn.MaxPool1d(kernel_size=2)
-        self.drop1 = nn.Dropout(0.3)
-
-        self.conv2 = nn.Conv1d(in_channels=64, out_channels=128, kernel_size=3)
-        self.bn2 = nn.BatchNorm1d(128)
-        self.pool2 = nn.MaxPool1d(kernel_size=2)
-        self.drop2 = nn.Dropout(0.3)
-
-        self.fc1 = nn.Linear(128 * 2, 128)
-        self.drop3 = nn.Dropout(0.5)
-        self.fc2 = nn.Linear(128, 64)
-        self.drop4 = nn.Dropout(0.5)
-        self.fc3 = nn.Linear(64, 2)  # 最终输出2类
-
-    def forward(self, x):
-        # x shape: (batch_size, 1, 16)
-        x = self.conv1(x)  # -> (batch_size, 64, 14)
-        x = nn.functional.relu(x)
-        x = self.bn1(x)
-        x = self.pool1(x)  # -> (batch_size, 64, 7)
-        x = self.drop1(x)
-
-        x = self.conv2(x)  # -> (batch_size, 128, 5)
-        x = nn.functional.relu(x)
-        x = self.bn2(x)
-        x = self.pool2(x)  # -> (batch_size, 128, 2)
-        x = self.drop2(x)
-
-        # 展平
-        x = x.view(x.size(0), -1)  # -> (batch_size, 128*2)=256
-        x = self.fc1(x)  # -> (batch_size, 128)
-        x = nn.functional.relu(x)
-        x = self.drop3(x)
-
-        x = self.fc2(x)  # -> (batch_size, 64)
-        x = nn.functional.relu(x)
-        x = self.drop4(x)
-
-        x = self.fc3(x)  # -> (batch_size, 2)
-        return x
-
-
-class StressCNNBiLSTM(nn.Module):
-    def __init__(self):
-        super(StressCNNBiLSTM, self).__init__()
-
-        # CNN layers
-        self.conv1 = nn.Conv1d(in_channels=1, out_channels=64, kernel_size=3)
-        self.bn1 = nn.BatchNorm1d(64)  # 添加了BatchNorm
-        self.pool1 = nn.MaxPool1d(kernel_size=2)
-        self.drop1 = nn.Dropout(0.3)
-
-        self.conv2 = nn.Conv1d(in_channels=64, out_channels=128, kernel_size=3)
-        self.bn2 = nn.BatchNorm1d(128)  # 添加了BatchNorm
-        self.pool2 = nn.MaxPool1d(kernel_size=2)
-        self.drop2 = nn.Dropout(0.3)
-
-        # BiLSTM layers
-        # 卷积池化后的特征大小: (batch_size, 128, 2)
-        # 转置后输入LSTM的形状: (batch_size, 2, 128)
-        self.lstm1 = nn.LSTM(128, 64, bidirectional=True, batch_first=True)
-        self.drop3 = nn.Dropout(0.5)
-
-        # Fully connected layers
-        self.fc1 = nn.Linear(64 * 2, 64)  # Flattened LSTM output
-        self.fc2 = nn.Linear(64, 32)
-        self.fc3 = nn.Linear(32, 2)
-
-    def forward(self, x):
-        # CNN forward pass
-        x = self.conv1(x)  # (batch_size, 64, 14)
-        x = nn.functional.relu(x)
-        x = self.bn1(x)  # 添加BatchNorm
-        x = self.pool1(x)  # (batch_size, 64, 7)
-        x = self.drop1(x)
-
-        x = self.conv2(x)  # (batch_size, 128, 5)
-        x = nn.functional.relu(x)
-        x = self.bn2(x)  # 添加BatchNorm
-        x = self.pool2(x)  # (batch_size, 128, 2)
-        x = self.drop2(x)
-
-        # Reshape to (batch_size, sequence_length, feature_size)
-        x = x.permute(0, 2, 1)  # (batch_size, 2, 128)
-
-        # BiLSTM forward pass
-        x, _ = self.lstm1(x)  # (batch_size, 2, 128)
-        x = self.drop3(x)
-
-        # 使用最后一个时间步的输出
-        x = x[:, -1, :]  # (batch_size, 64)
-        x = self.fc1(x)  # (batch_size, 64)
-        x = nn.functional.relu(x)
-        x = self.fc2(x)  # (batch_size, 32)
-        x = nn.functional.relu(x)
-        x = self.fc3(x)  # (batch_size, 2)
-
-        return x
-
-
-# 使用此类如果你使用的是Transformer模型
-class StressTransformer(nn.Module):
-    def __init__(self, input_dim=1, embed_dim=64, num_heads=4, ff_dim=128,
-                 num_transformer_blocks=2, mlp_units=[64], dropout=0.3, mlp_dropout=0.3):
-        super(StressTransformer, self).__init__()
-
-        # 初始特征嵌入层
-        self.embedding = nn.Linear(input_dim, embed_dim)
-
-        # Transformer块
-        self.transformer_blocks = nn.ModuleList([
-            TransformerBlock(embed_dim, num_heads, ff_dim, dropout)
-            for _ in range(num_transformer_blocks)
-        ])
-
-        # MLP分类器
-        layers = []
-        for dim in mlp_units:
-            layers.append(nn.Linear(embed_dim, dim))
-            layers.append(nn.ReLU())
-            layers.append(nn.Dropout(mlp_dropout))
-
-        self.mlp = nn.Sequential(*layers)
-
-        # 输出层
-        self.output_layer = nn.Linear(mlp_units[-1] if mlp_units else embed_dim, 2)
-
-    def forward(self, x):
-        # x的输入形状是(batch_size, seq_len, input_dim)
-
-        # 映射到嵌入空间
-        x = self.embedding(x)  # (batch_size, seq_len, embed_dim)
 
-        # 应用Transformer块
-        for transformer_block in self.transformer_blocks:
-            x = transformer_block(x)
-
-        # 全局平均池化 - 对序列维度进行平均
-        x = x.mean(dim=1)  # (batch_size, embed_dim)
-
-        # MLP分类器
-        x = self.mlp(x)
-
-        # 输出层
-        x = self.output_layer(x)
-
-        return x
-
-
-class TransformerBlock(nn.Module):
-    def __init__(self, embed_dim, num_heads, ff_dim, dropout=0.1):
-        super(TransformerBlock, self).__init__()
-
-        # 多头自注意力机制
-        self.att = nn.MultiheadAttention(embed_dim=embed_dim, num_heads=num_heads, dropout=dropout, batch_first=True)
-
-        # 前馈神经网络
-        self.ffn = nn.Sequential(
-            nn.Linear(embed_dim, ff_dim),
-            nn.ReLU(),
-            nn.Dropout(dropout),
-            nn.Linear(ff_dim, embed_dim)
-        )
-
-        # Layer Normalization
-        self.layernorm1 = nn.LayerNorm(embed_dim)
-        self.layernorm2 = nn.LayerNorm(embed_dim)
-
-        # Dropout
-        self.dropout1 = nn.Dropout(dropout)
-        self.dropout2 = nn.Dropout(dropout)
-
-    def forward(self, x):
-        # 第一个子层：多头自注意力 + 残差连接
-        attn_output, _ = self.att(x, x, x)
-        x = x + self.dropout1(attn_output)
-        x = self.layernorm1(x)
-
-        # 第二个子层：前馈神经网络 + 残差连接
-        ffn_output = self.ffn(x)
-        x = x + self.dropout2(ffn_output)
-        x = self.layernorm2(x)
-
-        return x
-
-
-def send_command(spi_dev, command):
-    spi_dev.xfer([command])
-
-
-def write_register(spi_dev, register, data):
-    write = 0x40
-    register_write = write | register
-    spi_dev.xfer([register_write, 0x00, data])
-
-
-def read_eeg_data(spi_dev):
-    output = spi_dev.readbytes(27)
-    result = [0] * 8
-    for a in range(3, 25, 3):
-        voltage_1 = (output[a] << 8) | output[a + 1]
-        voltage_1 = (voltage_1 << 8) | output[a + 2]
-
-        data_test = 0x7FFFFF
-        data_check = 0xFFFFFF
-
-        convert_voltage = voltage_1 | data_test
-        if convert_voltage == data_check:
-            voltage_1_after_convert = (voltage_1 - 16777214)
-        else:
-            voltage_1_after_convert = voltage_1
-
-        channel_num = int((a - 3) / 3)
-        if 0 <= channel_num < 8:
-            result[channel_num] = round(1000000 * 4.5 * (voltage_1_after_convert / 16777215), 2)
-
-    return result
-
-
-def initialize_spi_devices():
-    for dev in [spi, spi_2]:
-        send_command(dev, COMMANDS['wakeup'])
-        send_command(dev, COMMANDS['stop'])
-        send_command(dev, COMMANDS['reset'])
-        send_command(dev, COMMANDS['sdatac'])
-
-        write_register(dev, 0x14, 0x80)  # GPIO
-        write_register(dev, 0x01, 0x96)  # config1
-        write_register(dev, 0x02, 0xD4)  # config2
-        write_register(dev, 0x03, 0xFF)  # config3
-
-        for reg in [0x04, 0x0D, 0x0E, 0x0F, 0x10, 0x11, 0x15, 0x17]:
-            write_register(dev, reg, 0x00)
-        for ch in range(5, 13):
-            write_register(dev, ch, 0x00)
-
-        send_command(dev, COMMANDS['rdatac'])
-        send_command(dev, COMMANDS['start'])
-
-
-def real_time_prediction(model_path, model_type="CNN", window_size=10, threshold=0.5):
+# ADS1299 解码、采集后端等共享模块位于 robot_backend 目录
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "robot_backend"))
+from ads1299 import SAMPLE_RATE
+from acquisition import AcquisitionProcess, AcquisitionStats, AcquisitionThread
+from archive import ArchiveWriter
+from artifacts import ArtifactDetector
+from async_log import configure_logging, dropped_records, get_logger
+from decision import SMOOTHING_MODES, DecisionEngine
+from eeg_devices import HardwareDevice, open_device
+from inference import BatchedInference
+from inference_worker import STAGE_HELP, WORKER_MODES, InferenceWorker, parse_cpus, predictor_factory
+from metrics import METRICS, StageTimer, serve_metrics
+from model_registry import BACKENDS
+from recorder import SessionRecorder
+from ring_buffer import EEGRingBuffer
+
+# 输出经 async_log 的后台队列写出，读取线程和推理回调中不直接写终端
+log = get_logger("eeg.prediction")
+
+
+def real_time_prediction(model_path, model_type="CNN", window_size=10, threshold=0.5, daisy=False, device=None,
+                         record_path=None, archive_path=None, isolate=False, bandpass=None, notch_hz=None,
+                         gate_artifacts=True, batch_size=32, max_wait_ms=20.0, compiled=False, cache_dir=None,
+                         quantize=False, backend=None, worker_mode="inline", torch_threads=None, interop_threads=None,
+                         inference_cpus=None, acquisition_cpus=None, queue_size=4, smoothing="mean", hysteresis=0.05,
+                         dwell=5, metrics_port=None):
     """
     实时预测函数，使用滑动窗口平均化预测结果
 
     Args:
         model_path: 模型文件路径
-        model_type: 模型类型，"CNN"或"Transformer"
+        model_type: 模型类型，model_registry.REGISTRY 中的 "CNN"、"cnnbilstm" 或 "Transformer"
         window_size: 滑动窗口大小，用于平均预测结果
-        threshold: 预测阈值，超过此阈值则判断为stress
+        threshold: 预测阈值，平均概率超过此阈值则判断为stress
+        daisy: 两片 ADS1299 按菊花链连接时为 True，每个样本只需一次 54 字节传输
+        device: 采集后端 (eeg_devices)，默认打开真实硬件
+        record_path: 若指定，把原始样本和 stress 概率记录到该文件 (recorder.open_recording 读取)
+        archive_path: 若指定，把原始 24 位 ADC 码压缩归档到该文件 (archive.ArchiveReader 读取)
+        isolate: 为 True 时采集运行在独立进程中，通过共享内存环形缓冲区交给推理；
+            此时 device 须为在子进程中创建采集后端的工厂函数
+        bandpass: 若指定 (低截止, 高截止) Hz，推理前对 16 通道做带通滤波
+        notch_hz: 若指定 (50 或 60)，推理前做工频陷波
+        gate_artifacts: 为 True 时检查最近 0.5 秒的原始数据，电极饱和、平直、跳变或
+            高频噪声的窗口不做推理
+        batch_size: 每次前向计算最多处理的样本数
+        max_wait_ms: 收到第一个样本后凑批最多等待的时间 (毫秒)，决定最坏情况下的附加延迟
+        compiled: 为 True 时使用折叠 BN 后冻结的 TorchScript 模型 (compile_model)
+        cache_dir: 编译模型的缓存目录，默认为权重文件旁的 .model_cache
+        quantize: 为 True 时对 Linear / LSTM 层做动态 int8 量化 (quantize.quantize_model)
+        backend: 推理后端，"torch"、"onnx" (ONNX Runtime CPU) 或 "numpy" (仅 CNN)，
+            默认使用模型注册的首选后端；onnx / numpy 时 model_path 也可以直接是转换后的
+            .onnx / .npz 文件，给出 .pth 时自动转换为同名文件
+        worker_mode: 推理执行方式 (inference_worker.InferenceWorker)，"inline" 在读取线程中计算，
+            "thread" / "process" 在独立线程 / 进程中计算，不阻塞读取和采集
+        torch_threads: torch 算子内线程数 (torch.set_num_threads)
+        interop_threads: torch 算子间线程数 (torch.set_num_interop_threads)
+        inference_cpus: 推理绑定的 CPU 核集合，例如 {2, 3}
+        acquisition_cpus: 采集线程 / 进程绑定的 CPU 核集合，例如 {1}
+        queue_size: 等待推理的批数上限，超过时丢弃最旧的一批
+        smoothing: 概率平滑方式，"mean" (滑动平均) 或 "ewma" (指数加权平均)
+        hysteresis: 判断的滞回宽度，平均概率在 threshold ± hysteresis 之间时保持原判断
+        dwell: 新判断需要连续保持的样本数，达到后才输出结果改变
+        metrics_port: 若指定，在该端口提供 Prometheus 格式的 GET /metrics (各阶段耗时直方图)
     """
-    print(f"加载 {model_type} 模型...")
-
-    # 根据模型类型加载对应的模型
-    if model_type == "CNN":
-        model = StressCNN()
-        # 加载模型参数
-        model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
-    elif model_type == "Transformer":
-        # 对于Transformer模型，需要确保输入格式是(batch_size, seq_len, feature_dim)
-        model = StressTransformer()
-        model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
-    elif model_type == "cnnbilstm":
-        model = StressCNNBiLSTM()
-        model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
+    log.info("加载模型", model_type=model_type)
+
+    # 模型类、输入形状和默认后端由 model_registry 决定，只有 torch 后端才导入 torch；
+    # 模型在推理执行器的线程 / 进程中创建
+    factory = predictor_factory(model_path, model_type, backend, compiled, quantize, cache_dir)
+
+    # 微批推理：输入写入预分配的批缓冲区，一次前向计算处理整批样本
+    engine = BatchedInference(max_batch=batch_size, max_wait_ms=max_wait_ms)
+
+    log.info("初始化 EEG 数据缓冲区和采集后端", isolate=isolate)
+    # 采集写入的环形缓冲区 (保留最近 10 秒)，推理通过独立的读游标消费
+    if isolate:
+        if device is None:
+            device = functools.partial(HardwareDevice, daisy=daisy, toggle_cs=False)
+        acquisition = AcquisitionProcess(device, capacity=10 * SAMPLE_RATE, archive_path=archive_path,
+                                         cpus=acquisition_cpus)
+        ring = acquisition.ring
+        sample_rate = SAMPLE_RATE
     else:
-        raise ValueError(f"不支持的模型类型: {model_type}")
-
-    model.eval()
-
-    print("初始化 EEG 数据缓冲区和 SPI...")
-    # 创建一个缓冲区来存储最新的数据点
-    data_buffer = []
-
-    # 创建一个队列来存储最近的预测结果
-    prediction_window = deque(maxlen=window_size)
-
-    # 创建平滑概率队列
-    probability_window = deque(maxlen=window_size)
+        if device is None:
+            device = HardwareDevice(daisy=daisy, toggle_cs=False)
+        ring = EEGRingBuffer(capacity=10 * SAMPLE_RATE)
+        sample_rate = device.sample_rate
+    reader = ring.reader()
+
+    # 滤波只作用于推理输入，记录和归档仍保存原始数据
+    dsp = None
+    if bandpass is not None or notch_hz is not None:
+        # scipy.signal 导入需要约 1 秒，只在需要滤波时导入
+        from filters import StreamingFilter
+
+        dsp = StreamingFilter(sample_rate, bandpass=bandpass, notch_hz=notch_hz)
+        log.info("推理前滤波", bandpass_hz=bandpass, notch_hz=notch_hz)
+
+    detector = ArtifactDetector(sample_rate, window_size=sample_rate // 2) if gate_artifacts else None
+
+    # 平滑概率并判断 stress / unstress，只在判断结果改变时产生事件
+    decisions = DecisionEngine(window_size, threshold, smoothing, hysteresis=hysteresis, dwell=dwell)
+
+    # 记录器使用独立的读游标，记录每一个样本而不只是被推理的样本
+    recorder = None
+    if record_path:
+        recorder = SessionRecorder(record_path, sample_rate=sample_rate)
+        recorder.record_from(ring)
+        log.info("记录会话", path=record_path)
+
+    # 归档直接保存采集解码出的 ADC 码 (独立进程模式下由采集进程写入)
+    archive = None
+    if archive_path:
+        if not isolate:
+            archive = ArchiveWriter(archive_path, sample_rate=sample_rate)
+        log.info("归档原始数据", path=archive_path)
+
+    # 每批各阶段的耗时 (单调时钟)：读取线程中的凑批、滤波、伪迹检查和提交，推理在执行器中记录，
+    # 结果回调中的平滑判断和输出；以及批内最早样本从采集到判断完成的时间
+    loop_stages = StageTimer("eeg_stage_seconds", ("collect", "filter", "artifact_gate", "submit"), STAGE_HELP)
+    result_stages = StageTimer("eeg_stage_seconds", ("decision", "output"), STAGE_HELP)
+    sample_to_verdict = METRICS.histogram("eeg_sample_to_verdict_seconds", "批内最早样本从采集到判断更新完成的时间")
+
+    def on_result(index, timestamps, probs):
+        # 推理结果的平滑和判断；thread / process 模式下在推理线程 / 结果接收线程中调用
+        result_stages.start()
+        if recorder is not None:
+            recorder.set_probabilities(index - recorder.first_seq, probs)
+        events = decisions.update(probs, index, timestamps)
+        sample_to_verdict.observe(time.monotonic() - timestamps[0])
+        result_stages.mark("decision")
+
+        for event in events:
+            verdict = "🔴 Stress" if event['state'] == "stress" else "🟢 Unstress"
+            # 判断改变不合并
+            log.info("预测结果", rate_limit=False, verdict=verdict, state=event['state'], previous=event['previous'],
+                     probability=event['probability'], confidence=event['confidence'], seq=event['seq'])
+        result_stages.mark("output")
+
+    worker = InferenceWorker(factory, on_result, mode=worker_mode, cpus=inference_cpus, threads=torch_threads,
+                             interop_threads=interop_threads, queue_size=queue_size)
+    # 模型在采集开始前加载完成，避免导入 torch 等与采集争用 CPU
+    worker.start()
+    log.info("推理后端", backend=worker.backend, compiled=compiled, quantize=quantize, worker=worker_mode)
+
+    if isolate:
+        acquisition.start()
+    else:
+        device.start()
+        acquisition = AcquisitionThread(device, ring.write, on_codes=archive.write if archive else None,
+                                        stats=AcquisitionStats(ring.stats), cpus=acquisition_cpus)
+        acquisition.start()
 
-    initialize_spi_devices()
+    metrics_server = None
+    if metrics_port:
+        metrics_server = serve_metrics(metrics_port)
+        log.info("指标", url=f"http://0.0.0.0:{metrics_port}/metrics")
 
-    print(f"开始实时预测 (使用 {window_size} 帧滑动窗口)...")
-    last_prediction = None
-    consecutive_same = 0
+    log.info("开始实时预测", window_size=window_size, smoothing=smoothing, hysteresis=hysteresis, dwell=dwell)
+    overruns = 0
+    signal_ok = True
 
     try:
         while True:
-            # 读取数据
-            data_1 = read_eeg_data(spi)
-            data_2 = read_eeg_data(spi_2)
-            current_data = data_1 + data_2
-
-            if len(current_data) != 16:
-                print(f"警告：EEG数据长度异常 ({len(current_data)})")
-                time.sleep(0.1)
+            # 收集一批样本 (凑满 batch_size 个或等待 max_wait_ms)，落后超过缓冲区容量的部分计入 reader.overruns
+            loop_stages.start()
+            n = engine.collect(reader, timeout=1.0)
+            loop_stages.mark("collect")
+            if n == 0:
+                if acquisition.finished.is_set():
+                    log.info("采集已结束")
+                    break
                 continue
-
-            # 存储当前数据点
-            data_buffer = current_data
-
-            # 准备输入模型的数据
-            if model_type == "CNN":
-                # CNN模型: [batch_size=1, channels=1, features=16]
-                input_tensor = torch.FloatTensor(data_buffer).unsqueeze(0).unsqueeze(0)
-            elif model_type == "Transformer":
-                # Transformer模型: [batch_size=1, seq_len=16, feature_dim=1]
-                input_tensor = torch.FloatTensor(data_buffer).view(1, 16, 1)
-            elif model_type == "cnnbilstm":
-                input_tensor = torch.FloatTensor(data_buffer).unsqueeze(0).unsqueeze(0)
-
-            # 预测
-            with torch.no_grad():
-                outputs = model(input_tensor)
-                probabilities = torch.softmax(outputs, dim=1)
-                stress_prob = probabilities[0][1].item()  # stress的概率
-
-                # 添加到概率窗口
-                probability_window.append(stress_prob)
-
-                # 计算概率的平均值
-                avg_probability = sum(probability_window) / len(probability_window)
-
-                # 根据平均概率判断类别
-                predicted_class = 1 if avg_probability > threshold else 0
-                prediction_window.append(predicted_class)
-
-                # 计算窗口内的多数类别
-                stress_count = sum(prediction_window)
-                unstress_count = len(prediction_window) - stress_count
-
-                # 综合判断最终预测结果
-                final_prediction = 1 if stress_count > unstress_count else 0
-                final_confidence = stress_count / len(
-                    prediction_window) if final_prediction == 1 else unstress_count / len(prediction_window)
-
-                # 跟踪连续相同的预测次数
-                if last_prediction is not None and final_prediction == last_prediction:
-                    consecutive_same += 1
-                else:
-                    consecutive_same = 0
-                last_prediction = final_prediction
-
-                # 显示详细信息
-                print(f"\n当前stress概率: {stress_prob:.4f}, 窗口平均: {avg_probability:.4f}")
-                print(
-                    f"窗口中stress占比: {stress_count}/{len(prediction_window)} = {stress_count / len(prediction_window):.2f}")
-
-                # 稳定性指标 - 只有当连续5次以上相同预测才显示最终结果
-                if consecutive_same >= 5 or len(prediction_window) < window_size // 2:
-                    verdict = "🔴 Stress" if final_prediction == 1 else "🟢 Unstress"
-                    print(f"预测结果: {verdict} (置信度: {final_confidence:.2f}, 连续{consecutive_same + 1}次)")
-                else:
-                    print("稳定中...")
-
-            time.sleep(0.2)  # 控制采样频率
+            batch = engine.batch[:n]
+            if dsp is not None:
+                # 整批样本一起滤波；读游标落后丢失样本后数据不连续，重新初始化滤波器
+                if reader.overruns != overruns:
+                    overruns = reader.overruns
+                    dsp.reset()
+                batch[:] = dsp.process(batch)
+                loop_stages.mark("filter")
+
+            # 伪迹检查基于原始数据 (饱和判断需要未滤波的幅值)，不合格的整批跳过推理
+            if detector is not None:
+                overwritten = detector.overwritten
+                accepted = detector.check_ring(ring, end=reader.cursor)
+                loop_stages.mark("artifact_gate")
+                if detector.overwritten != overwritten:
+                    # 读游标落后，这批的原始数据已被覆盖无法检查，跳过但不改变信号状态
+                    continue
+                if accepted != signal_ok:
+                    signal_ok = accepted
+                    if accepted:
+                        log.info("✅ 信号恢复正常，继续预测", rate_limit=False)
+                    else:
+                        log.warning("⚠️ 信号质量差，暂停预测", rate_limit=False, bad_channels=detector.bad_channels())
+                if not accepted:
+                    continue
+
+            # 整批做一次前向计算，得到每个样本的stress概率 (thread / process 模式下异步完成)
+            worker.submit(engine.index[:n], engine.timestamps[:n], batch)
+            loop_stages.mark("submit")
 
     except KeyboardInterrupt:
-        print("\n实时预测已中止")
+        log.info("实时预测已中止")
     except Exception as e:
-        print(f"\n发生错误：{e}")
+        log.error("发生错误", error=e, exc_info=True)
     finally:
+        acquisition.stop()
+        worker.stop()
+        stats = acquisition.stats.snapshot()
+        log.info("采集统计", samples=stats['samples'], dropped=stats['dropped'], drop_rate=stats['drop_rate'],
+                 corrupt=stats['corrupt'], timeouts=stats['timeouts'], overruns=reader.overruns,
+                 jitter_rms_ms=stats['jitter_rms_ms'], jitter_max_ms=stats['jitter_max_ms'])
+        if worker.submitted:
+            log.info("推理统计", batches=worker.submitted, mean_batch=worker.samples / worker.submitted,
+                     dropped_batches=worker.dropped)
+        stages = dict(loop_stages.summary(), **result_stages.summary())
+        if worker.inference_seconds.count:
+            stages['inference'] = {'mean_ms': 1000.0 * worker.inference_seconds.mean(),
+                                   'p95_ms': 1000.0 * worker.inference_seconds.quantile(0.95)}
+        if not isolate:
+            stages.update(acquisition.stages.summary())
+        log.info("阶段耗时 (平均 / p95 上限, 毫秒)",
+                 **{name: f"{s['mean_ms']:.3f}/{s['p95_ms']:.3f}" for name, s in stages.items()})
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        summary = decisions.snapshot()
+        log.info("判断统计", **summary)
+        if detector is not None:
+            quality = detector.snapshot()
+            log.info("信号质量", accepted=quality['accepted'], skipped=quality['skipped'],
+                     overwritten=quality['overwritten'], skip_rate=quality['skip_rate'])
+        if dropped_records():
+            log.warning("日志队列已满，丢弃了部分记录", dropped=dropped_records())
+        if recorder is not None:
+            recorder.close()
+        if archive is not None:
+            archive.close()
+        if isolate:
+            acquisition.close()
         return
 
 
 def main():
+    parser = argparse.ArgumentParser(description="EEG 实时压力预测")
+    parser.add_argument("--backend", choices=["spi", "synthetic", "replay"], default="spi",
+                        help="采集后端: 真实硬件、ADS1299 模拟器或回放录制数据")
+    parser.add_argument("--replay", help="回放的记录、归档或原始帧文件 (--backend replay)")
+    parser.add_argument("--fast", action="store_true", help="模拟/回放时不按采样率等待，尽可能快地运行")
+    parser.add_argument("--record", help="把原始样本和预测概率记录到该文件")
+    parser.add_argument("--archive", help="把原始 ADC 码压缩归档到该文件")
+    parser.add_argument("--isolate", action="store_true", help="采集运行在独立进程中，通过共享内存交给推理")
+    parser.add_argument("--bandpass", nargs=2, type=float, metavar=("LOW", "HIGH"),
+                        help="推理前的带通滤波范围 (Hz)，例如 --bandpass 1 45")
+    parser.add_argument("--notch", type=float, choices=[50.0, 60.0], help="推理前的工频陷波频率 (Hz)")
+    parser.add_argument("--no-artifact-gate", action="store_true", help="不检查伪迹，对每个样本都做推理")
+    parser.add_argument("--batch-size", type=int, default=32, help="每次前向计算最多处理的样本数")
+    parser.add_argument("--max-wait-ms", type=float, default=20.0, help="凑批最多等待的时间 (毫秒)")
+    parser.add_argument("--compile", action="store_true", help="使用折叠 BN 后冻结的 TorchScript 模型 (缓存到磁盘)")
+    parser.add_argument("--cache-dir", help="编译模型的缓存目录")
+    parser.add_argument("--quantize", action="store_true", help="对 Linear / LSTM 层做动态 int8 量化")
+    parser.add_argument("--inference-backend", choices=BACKENDS,
+                        help="推理后端: PyTorch、ONNX Runtime 或 NumPy (仅 CNN)，默认使用模型注册的首选后端 (--compile / --quantize 时为 PyTorch)")
+    parser.add_argument("--worker", choices=WORKER_MODES, default="inline",
+                        help="推理执行方式: 读取线程内、独立线程或独立进程")
+    parser.add_argument("--torch-threads", type=int, help="torch 算子内线程数")
+    parser.add_argument("--interop-threads", type=int, help="torch 算子间线程数")
+    parser.add_argument("--inference-cpus", help="推理绑定的 CPU 核，例如 2-3")
+    parser.add_argument("--acquisition-cpus", help="采集绑定的 CPU 核，例如 1")
+    parser.add_argument("--smoothing", choices=SMOOTHING_MODES, default="mean",
+                        help="概率平滑方式: 滑动平均或指数加权平均")
+    parser.add_argument("--hysteresis", type=float, default=0.05, help="判断的滞回宽度 (概率)")
+    parser.add_argument("--dwell", type=int, default=5, help="新判断需要连续保持的样本数")
+    parser.add_argument("--metrics-port", type=int, help="在该端口提供 Prometheus 格式的 /metrics")
+    parser.add_argument("--queue-size", type=int, default=4, help="等待推理的批数上限，超过时丢弃最旧的一批")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    parser.add_argument("--log-json", action="store_true", help="日志每条一行 JSON")
+    args = parser.parse_args()
+
+    configure_logging(args.log_level, json_lines=args.log_json)
+
     # 使用你保存的模型路径
     model_path = 'cnn_bilstm_model_50epoch.pth'  # 或 'stress_cnn_model_15epoch.pth'
     model_type = "cnnbilstm"  # 或 "CNN"
@@ -447,18 +296,53 @@ def main():
     # 预测阈值
     threshold = 0.5
 
+    # 两片 ADS1299 是否按菊花链连接 (共用 CS，一次读出 16 通道)
+    daisy = False
+
+    if args.backend == "spi":
+        device_factory = functools.partial(HardwareDevice, daisy=daisy, toggle_cs=False)
+    elif args.backend == "synthetic":
+        device_factory = functools.partial(open_device, "synthetic", realtime=not args.fast)
+    else:
+        device_factory = functools.partial(open_device, "replay", source=args.replay, realtime=not args.fast)
+    # 独立进程模式下采集后端在子进程中创建
+    device = device_factory if args.isolate else device_factory()
+
     try:
         real_time_prediction(
             model_path=model_path,
             model_type=model_type,
             window_size=window_size,
-            threshold=threshold
+            threshold=threshold,
+            device=device,
+            record_path=args.record,
+            archive_path=args.archive,
+            isolate=args.isolate,
+            bandpass=args.bandpass,
+            notch_hz=args.notch,
+            gate_artifacts=not args.no_artifact_gate,
+            batch_size=args.batch_size,
+            max_wait_ms=args.max_wait_ms,
+            compiled=args.compile,
+            cache_dir=args.cache_dir,
+            quantize=args.quantize,
+            backend=args.inference_backend,
+            worker_mode=args.worker,
+            torch_threads=args.torch_threads,
+            interop_threads=args.interop_threads,
+            inference_cpus=parse_cpus(args.inference_cpus),
+            acquisition_cpus=parse_cpus(args.acquisition_cpus),
+            queue_size=args.queue_size,
+            smoothing=args.smoothing,
+            hysteresis=args.hysteresis,
+            dwell=args.dwell,
+            metrics_port=args.metrics_port
         )
     except KeyboardInterrupt:
-        print("实时预测已中止")
+        log.info("实时预测已中止")
     finally:
-        spi.close()
-        spi_2.close()
+        if not args.isolate:
+            device.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,207 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "robot_backend"))
+from ads1299 import SAMPLE_RATE
+from artifacts import ArtifactDetector
+from decision import SMOOTHING_MODES, DecisionEngine
+from eeg_devices import load_session
+from inference_worker import configure_torch
+from model_registry import BACKENDS, REGISTRY, create_predictor
+
+# 判断事件在 .npz 中的存储格式
+EVENT_DTYPE = np.dtype([('seq', np.int64), ('state', np.int8), ('probability', np.float32)])
+
+# 进程池中每个进程创建一次的预测函数，创建失败时为 None 并记录错误
+_predict = None
+_init_error = None
+
+
+def _init_worker(model_path, model_type, backend, threads):
+    # 初始化函数抛出异常时进程池会不断重启进程，错误改为由 _score 逐个返回
+    global _predict, _init_error
+    try:
+        _predict = create_predictor(model_path, model_type, backend)[0]
+        configure_torch(threads)
+    except Exception as e:
+        _init_error = f"无法加载模型: {e}"
+
+
+def default_output_path(session_path, output_dir=None):
+    """<会话文件名>.scores.npz，默认与会话文件在同一目录"""
+    directory = output_dir or os.path.dirname(os.path.abspath(session_path))
+    return os.path.join(directory, os.path.basename(session_path) + ".scores.npz")
+
+
+def gate_mask(samples, sample_rate=SAMPLE_RATE, block_size=32):
+    """
+    按实时路径的方式做伪迹检查：每 block_size 个样本 (一批) 检查截至批尾的最近 0.5 秒原始数据
+
+    Returns:
+        (n,) bool，True 表示该样本会被推理
+    """
+    detector = ArtifactDetector(sample_rate, window_size=sample_rate // 2)
+    mask = np.zeros(len(samples), dtype=bool)
+    for start in range(0, len(samples), block_size):
+        end = min(start + block_size, len(samples))
+        mask[start:end] = detector.check(samples[max(0, end - detector.window_size):end])
+    return mask
+
+
+def score_session(path, predict, output_path=None, chunk_size=8192, bandpass=None, notch_hz=None,
+                  gate_artifacts=True, block_size=32, window_size=15, threshold=0.5, smoothing="mean",
+                  hysteresis=0.05, dwell=5):
+    """
+    给一个记录的会话逐样本打分，并按实时路径的平滑和判断规则得到判断结果
+
+    Args:
+        path: 记录、归档或原始帧文件 (eeg_devices.load_session)
+        predict: predict(batch) -> stress 概率
+        output_path: 结果 .npz，默认为 default_output_path(path)
+        chunk_size: 每次前向计算的样本数
+        bandpass / notch_hz: 同 real_time_prediction，推理前的滤波
+        gate_artifacts: 同 real_time_prediction，被伪迹检查拒绝的样本不打分
+        block_size: 伪迹检查的批大小，对应实时路径的 batch_size
+        window_size / threshold / smoothing / hysteresis / dwell: 同 decision.DecisionEngine
+
+    Returns:
+        dict: 样本数、打分的样本数、stress 占比、判断改变次数和耗时
+    """
+    t0 = time.perf_counter()
+    raw = load_session(path)
+    n = len(raw)
+    samples = np.asarray(raw, dtype=np.float32)
+    if bandpass is not None or notch_hz is not None:
+        from filters import filter_offline
+
+        samples = filter_offline(samples, bandpass=bandpass, notch_hz=notch_hz)
+    accepted = np.flatnonzero(gate_mask(raw, block_size=block_size)) if gate_artifacts else np.arange(n)
+
+    # 未打分的样本概率为 NaN，判断为 -1 (未确定)
+    probs = np.full(n, np.nan, dtype=np.float32)
+    smoothed = np.full(n, np.nan, dtype=np.float32)
+    verdicts = np.full(n, -1, dtype=np.int8)
+    decisions = DecisionEngine(window_size, threshold, smoothing, hysteresis=hysteresis, dwell=dwell)
+    events = []
+    for start in range(0, len(accepted), chunk_size):
+        index = accepted[start:start + chunk_size]
+        chunk_probs = predict(np.ascontiguousarray(samples[index]))
+        probs[index] = chunk_probs
+        events += decisions.update(chunk_probs, index)
+        smoothed[index] = decisions.last_smoothed
+
+    # 判断结果从每次改变的样本起保持到下一次改变
+    event_array = np.array([(e['seq'], 1 if e['state'] == "stress" else 0, e['probability']) for e in events],
+                           dtype=EVENT_DTYPE)
+    for i, event in enumerate(event_array):
+        end = event_array['seq'][i + 1] if i + 1 < len(event_array) else n
+        verdicts[event['seq']:end] = event['state']
+
+    output_path = output_path or default_output_path(path)
+    np.savez(output_path, probs=probs, smoothed=smoothed, verdicts=verdicts, events=event_array)
+    return {
+        'session': path,
+        'output': output_path,
+        'samples': n,
+        'scored': len(accepted),
+        'stress_fraction': float(np.mean(verdicts[verdicts >= 0] == 1)) if np.any(verdicts >= 0) else 0.0,
+        'transitions': len(event_array),
+        'seconds': time.perf_counter() - t0,
+    }
+
+
+def _score(job):
+    path, output_path, options = job
+    if _init_error is not None:
+        return {'session': path, 'error': _init_error}
+    try:
+        return score_session(path, _predict, output_path, **options)
+    except Exception as e:
+        return {'session': path, 'error': str(e)}
+
+
+def score_sessions(paths, model_path, model_type, backend=None, processes=None, threads=1, output_dir=None, **options):
+    """
+    用进程池给多个会话打分，每个进程加载一次模型
+
+    Args:
+        paths: 会话文件列表
+        processes: 进程数，默认为 CPU 核数 (不超过会话数)
+        threads: 每个进程的 torch 线程数
+        options: 传给 score_session 的参数
+
+    Returns:
+        逐个产生 score_session 结果的迭代器；模型无法加载时在创建进程池之前直接抛出异常
+    """
+    create_predictor(model_path, model_type, backend)
+    processes = max(1, min(processes or os.cpu_count() or 1, len(paths)))
+    jobs = [(path, default_output_path(path, output_dir), options) for path in paths]
+    # 先处理大文件，避免最后只剩一个进程在算
+    jobs.sort(key=lambda job: os.path.getsize(job[0]) if os.path.exists(job[0]) else 0, reverse=True)
+    return _score_all(jobs, processes, (model_path, model_type, backend, threads))
+
+
+def _score_all(jobs, processes, initargs):
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+        yield from pool.imap_unordered(_score, jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线给记录的会话逐样本打分并得到平滑后的判断结果")
+    parser.add_argument("sessions", nargs="+", help="记录、归档或原始帧文件")
+    parser.add_argument("--model", required=True, help="模型文件")
+    parser.add_argument("--type", default="cnnbilstm", choices=list(REGISTRY), help="模型类型")
+    parser.add_argument("--inference-backend", choices=BACKENDS, help="推理后端，默认使用模型注册的首选后端")
+    parser.add_argument("--output-dir", help="结果目录，默认与会话文件在同一目录")
+    parser.add_argument("--processes", type=int, help="进程数，默认为 CPU 核数")
+    parser.add_argument("--threads", type=int, default=1, help="每个进程的 torch 线程数")
+    parser.add_argument("--chunk-size", type=int, default=8192, help="每次前向计算的样本数")
+    parser.add_argument("--bandpass", nargs=2, type=float, metavar=("LOW", "HIGH"), help="推理前的带通滤波范围 (Hz)")
+    parser.add_argument("--notch", type=float, choices=[50.0, 60.0], help="推理前的工频陷波频率 (Hz)")
+    parser.add_argument("--no-artifact-gate", action="store_true", help="不检查伪迹，对每个样本都打分")
+    parser.add_argument("--batch-size", type=int, default=32, help="实时路径的批大小，决定伪迹检查的间隔")
+    parser.add_argument("--window-size", type=int, default=15, help="平滑窗口大小")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--smoothing", choices=SMOOTHING_MODES, default="mean")
+    parser.add_argument("--hysteresis", type=float, default=0.05)
+    parser.add_argument("--dwell", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    options = dict(chunk_size=args.chunk_size, bandpass=args.bandpass, notch_hz=args.notch,
+                   gate_artifacts=not args.no_artifact_gate, block_size=args.batch_size,
+                   window_size=args.window_size, threshold=args.threshold, smoothing=args.smoothing,
+                   hysteresis=args.hysteresis, dwell=args.dwell)
+
+    t0 = time.perf_counter()
+    total = 0
+    failed = 0
+    try:
+        results = score_sessions(args.sessions, args.model, args.type, args.inference_backend, args.processes,
+                                 args.threads, args.output_dir, **options)
+    except Exception as e:
+        raise SystemExit(f"❌ 无法加载模型 {args.model}: {e}")
+    for r in results:
+        if 'error' in r:
+            failed += 1
+            print(f"❌ {r['session']}: {r['error']}")
+            continue
+        total += r['samples']
+        print(f"✅ {r['session']}: {r['samples']} 个样本, 打分 {r['scored']}, "
+              f"stress 占比 {r['stress_fraction']:.2%}, 判断改变 {r['transitions']} 次, "
+              f"{r['seconds']:.1f} 秒 -> {r['output']}")
+    elapsed = time.perf_counter() - t0
+    print(f"共 {len(args.sessions) - failed} 个会话, {total} 个样本 ({total / SAMPLE_RATE / 3600:.2f} 小时), "
+          f"用时 {elapsed:.1f} 秒")
+    if failed:
+        raise SystemExit(f"{failed} 个会话失败")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from models import StressCNN
+from numpy_engine import NPZ_VERSION, NumpyStressCNN, fold_state_dict, load_params
+
+
+def random_cnn(seed=0, negative_scale=False):
+    """随机参数的 StressCNN (eval 模式)，BN 统计量也随机，negative_scale 时部分 BN scale 为负 (不能折叠)"""
+    torch.manual_seed(seed)
+    model = StressCNN().eval()
+    with torch.no_grad():
+        for bn in (model.bn1, model.bn2):
+            bn.running_mean.normal_(0.0, 1.0)
+            bn.running_var.uniform_(0.5, 2.0)
+            bn.weight.uniform_(0.5, 1.5)
+            bn.bias.normal_(0.0, 0.5)
+            if negative_scale:
+                bn.weight[::3] *= -1
+    return model
+
+
+def torch_logits(model, x):
+    with torch.no_grad():
+        return model(torch.from_numpy(x).unsqueeze(1)).numpy()
+
+
+@pytest.mark.parametrize("negative_scale", [False, True], ids=["folded", "unfolded"])
+@pytest.mark.parametrize("batch_size", [1, 7, 256])
+def test_logits_match_torch(batch_size, negative_scale):
+    model = random_cnn(negative_scale=negative_scale)
+    params = fold_state_dict({k: v.numpy().astype(np.float64) for k, v in model.state_dict().items()})
+    assert ("bn1.scale" in params) == negative_scale
+
+    x = np.random.default_rng(batch_size).normal(0.0, 50.0, (batch_size, 16)).astype(np.float32)
+    engine = NumpyStressCNN(params)
+    expected = torch_logits(model, x)
+    np.testing.assert_allclose(engine.logits(x), expected, atol=1e-4, rtol=0)
+    probs = torch.softmax(torch.from_numpy(expected), dim=1)[:, 1].numpy()
+    np.testing.assert_allclose(engine.predict(x), probs, atol=1e-5, rtol=0)
+
+
+def test_load_params_converts_and_reconverts(tmp_path):
+    model_path = str(tmp_path / "cnn.pth")
+    torch.save(random_cnn(seed=1).state_dict(), model_path)
+    params = load_params(model_path)
+    assert int(params["version"]) == NPZ_VERSION
+    x = np.random.default_rng(0).normal(0.0, 50.0, (4, 16)).astype(np.float32)
+    np.testing.assert_allclose(NumpyStressCNN(params).logits(x), torch_logits(random_cnn(seed=1), x), atol=1e-4)
+
+    # 早期没有 version 的 .npz 视为过期并重新转换
+    npz_path = str(tmp_path / "cnn.npz")
+    np.savez(npz_path, **{k: v for k, v in params.items() if k != "version"})
+    later = time.time() + 10
+    os.utime(npz_path, (later, later))
+    assert int(load_params(model_path)["version"]) == NPZ_VERSION
+
+    # .pth 比 .npz 新时重新转换
+    torch.save(random_cnn(seed=2).state_dict(), model_path)
+    os.utime(model_path, (later + 10, later + 10))
+    np.testing.assert_allclose(NumpyStressCNN(load_params(model_path)).logits(x),
+                               torch_logits(random_cnn(seed=2), x), atol=1e-4)
+
@@ -0,0 +1,236 @@
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy as np
+
+from ads1299 import LOFF_MASK, STATUS_HEADER, STATUS_MASK, UV_PER_CODE, decode_codes, decode_status
+from archive import ArchiveWriter
+from metrics import StageTimer
+from ring_buffer import SharedEEGRingBuffer
+
+
+def set_thread_affinity(cpus):
+    """
+    把调用线程绑定到给定的 CPU 核 (Linux 上 sched_setaffinity(0) 只作用于当前线程)
+
+    Args:
+        cpus: CPU 编号的集合，None 表示不绑定
+    """
+    if cpus is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, set(cpus))
+
+
+class AcquisitionStats:
+    """
+    采集统计计数器
+
+    计数保存在一个 float64 数组中。传入 ring.stats 时计数位于环形缓冲区内部，
+    共享内存模式下父进程可以直接读取子进程的统计。只有采集线程写入，
+    读取方通过 snapshot() 获得某一时刻的副本。
+
+    Args:
+        values: 长度不小于 len(FIELDS) 的 float64 数组，默认新建
+    """
+
+    FIELDS = ('samples', 'dropped', 'corrupt', 'timeouts', 'intervals', 'jitter_sum_sq', 'jitter_max', 'lead_off')
+
+    def __init__(self, values=None):
+        if values is None:
+            values = np.zeros(len(self.FIELDS), dtype=np.float64)
+        self.values = values
+
+    def __getattr__(self, name):
+        if name in AcquisitionStats.FIELDS:
+            return self.values[AcquisitionStats.FIELDS.index(name)]
+        raise AttributeError(name)
+
+    def add(self, field, n=1):
+        self.values[self.FIELDS.index(field)] += n
+
+    def add_interval(self, jitter):
+        i = self.FIELDS.index('intervals')
+        self.values[i] += 1
+        self.values[i + 1] += jitter * jitter
+        self.values[i + 2] = max(self.values[i + 2], jitter)
+
+    def snapshot(self):
+        """
+        Returns:
+            各计数的 dict，另附抖动的 RMS / 最大值 (毫秒) 和丢帧率
+        """
+        stats = dict(zip(self.FIELDS, self.values[:len(self.FIELDS)].tolist()))
+        for name in ('samples', 'dropped', 'corrupt', 'timeouts', 'intervals', 'lead_off'):
+            stats[name] = int(stats[name])
+        intervals = max(stats['intervals'], 1)
+        stats['jitter_rms_ms'] = 1000.0 * (stats.pop('jitter_sum_sq') / intervals) ** 0.5
+        stats['jitter_max_ms'] = 1000.0 * stats.pop('jitter_max')
+        expected = stats['samples'] + stats['dropped'] + stats['corrupt']
+        stats['drop_rate'] = stats['dropped'] / expected if expected else 0.0
+        return stats
+
+
+class AcquisitionThread(threading.Thread):
+    """
+    DRDY 中断驱动的采集线程
+
+    线程阻塞在采集后端的 DRDY 上 (不占用 CPU)，每次就绪读取一个样本，
+    用单调时钟打上时间戳和序列号后交给 on_sample(sample, timestamp, seq)。
+
+    序列号按 DRDY 节拍递增：一次等到多个 DRDY 说明读取落后、芯片已覆盖了
+    之前的帧，序列号跳过这些帧并计入 stats.dropped。状态字高 4 位不是 1100
+    的帧 (SPI 错位或总线干扰) 计入 stats.corrupt 并丢弃。相邻样本的时间间隔
+    与采样周期之差计入抖动统计。
+
+    Args:
+        device: eeg_devices 中的采集后端
+        on_sample: 样本回调 (16 通道 µV)，在采集线程中调用，应尽快返回
+        timeout: 等待 DRDY 的超时时间 (秒)，超时后检查停止标志
+        on_codes: 可选的原始 24 位 ADC 码回调，例如 ArchiveWriter.write
+        stats: 可选的 AcquisitionStats，例如 AcquisitionStats(ring.stats)
+        cpus: 采集线程绑定的 CPU 核，避免与推理线程池争用
+    """
+
+    def __init__(self, device, on_sample, timeout=1.0, on_codes=None, stats=None, cpus=None):
+        super(AcquisitionThread, self).__init__(name="ads1299-acquisition", daemon=True)
+        self.device = device
+        self.on_sample = on_sample
+        self.on_codes = on_codes
+        self.timeout = timeout
+        self.cpus = cpus
+        self.stats = stats if stats is not None else AcquisitionStats()
+        # 每个样本的读取、解码和写入耗时 (独立进程模式下记录在采集进程中)
+        self.stages = StageTimer("eeg_acquisition_stage_seconds", ("spi_read", "decode", "write"),
+                                 "采集线程每个样本各阶段的耗时")
+        self.seq = 0
+        self.finished = threading.Event()
+        self._stop_event = threading.Event()
+
+    @property
+    def samples(self):
+        return int(self.stats.samples)
+
+    @property
+    def timeouts(self):
+        return int(self.stats.timeouts)
+
+    def run(self):
+        set_thread_affinity(self.cpus)
+        stats = self.stats
+        stages = self.stages
+        period = 1.0 / self.device.sample_rate
+        # 不按采样率节拍输出的后端 (快速回放) 没有可比较的时间间隔
+        paced = getattr(self.device, 'realtime', True)
+        last_timestamp = None
+        try:
+            while not self._stop_event.is_set():
+                ready = self.device.wait_drdy(self.timeout)
+                if not ready:
+                    stats.add('timeouts')
+                    last_timestamp = None
+                    continue
+
+                timestamp = time.monotonic()
+                stages.start()
+                frame = self.device.read_frame()
+                stages.mark("spi_read")
+                # 错过的 DRDY 对应的帧已被芯片覆盖，序列号跳过它们
+                self.seq += ready
+                seq = self.seq - 1
+                if ready > 1:
+                    stats.add('dropped', ready - 1)
+                if paced and last_timestamp is not None:
+                    stats.add_interval(abs(timestamp - last_timestamp - ready * period))
+                last_timestamp = timestamp
+
+                status = decode_status(frame)
+                if np.any((status & STATUS_MASK) != STATUS_HEADER):
+                    stats.add('corrupt')
+                    continue
+                if np.any(status & LOFF_MASK):
+                    stats.add('lead_off')
+
+                codes = decode_codes(frame).reshape(-1)
+                sample = codes.astype(np.float32) * np.float32(UV_PER_CODE)
+                stages.mark("decode")
+                stats.add('samples')
+                if self.on_codes is not None:
+                    self.on_codes(codes, timestamp)
+                self.on_sample(sample, timestamp, seq)
+                stages.mark("write")
+        except EOFError:
+            # 回放后端的数据已经读完
+            pass
+        finally:
+            self.finished.set()
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+
+def _acquisition_main(ring_name, device_factory, archive_path, stop_event, finished, cpus):
+    # 子进程入口: 只使用 numpy 和采集后端，不使用 torch
+    ring = SharedEEGRingBuffer.attach(ring_name)
+    device = device_factory()
+    archive = ArchiveWriter(archive_path, sample_rate=device.sample_rate) if archive_path else None
+    thread = AcquisitionThread(device, ring.write, on_codes=archive.write if archive else None,
+                               stats=AcquisitionStats(ring.stats), cpus=cpus)
+    try:
+        device.start()
+        thread.start()
+        while not stop_event.is_set() and not thread.finished.is_set():
+            stop_event.wait(0.5)
+    finally:
+        thread.stop()
+        device.close()
+        if archive is not None:
+            archive.close()
+        ring.close()
+        finished.set()
+
+
+class AcquisitionProcess:
+    """
+    在独立进程中运行采集，样本写入共享内存环形缓冲区
+
+    推理进程里的 torch 线程池、GIL 和 GC 停顿都不会影响采集进程读取 DRDY。
+    本进程通过 self.ring (SharedEEGRingBuffer) 读取，其它进程可用
+    SharedEEGRingBuffer.attach(self.ring.name) 连接。子进程的采集统计
+    写在共享内存中，可通过 self.stats 读取。
+
+    Args:
+        device_factory: 在子进程中创建采集后端的可调用对象，
+            例如 functools.partial(open_device, "synthetic")
+        capacity: 环形缓冲区容量 (样本数)
+        archive_path: 若指定，子进程同时把原始 ADC 码归档到该文件
+        cpus: 采集线程绑定的 CPU 核
+    """
+
+    def __init__(self, device_factory, capacity, channels=16, archive_path=None, cpus=None):
+        self.ring = SharedEEGRingBuffer.create(capacity, channels)
+        self.stats = AcquisitionStats(self.ring.stats)
+        self._stop_event = multiprocessing.Event()
+        self.finished = multiprocessing.Event()
+        self.process = multiprocessing.Process(
+            target=_acquisition_main,
+            args=(self.ring.name, device_factory, archive_path, self._stop_event, self.finished, cpus),
+            name="ads1299-acquisition",
+            daemon=True,
+        )
+
+    def start(self):
+        self.process.start()
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        if self.process.is_alive():
+            self.process.join(timeout)
+
+    def close(self):
+        """释放共享内存，须在所有读者停止之后调用"""
+        self.stats = AcquisitionStats(self.stats.values.copy())
+        self.ring.close()
+        self.ring.unlink()
@@ -0,0 +1,163 @@
+import numpy as np
+
+# ADS1299 RDATAC 数据帧: 3 字节状态字 + 8 通道 × 3 字节 (24 位补码, 大端)
+STATUS_BYTES = 3
+BYTES_PER_CHANNEL = 3
+CHANNELS = 8
+FRAME_SIZE = STATUS_BYTES + BYTES_PER_CHANNEL * CHANNELS  # 27
+
+# 状态字高 4 位固定为 1100，其后是 LOFF_STATP / LOFF_STATN / GPIO
+STATUS_HEADER = 0xC00000
+STATUS_MASK = 0xF00000
+# 状态字中 LOFF_STATP (bit 12-19) 和 LOFF_STATN (bit 4-11) 的位置
+LOFF_MASK = 0x0FFFF0
+
+# config1=0x96 时的输出数据率 (DR=110 -> 250 SPS)
+SAMPLE_RATE = 250
+
+# ADC 码 -> µV 的换算系数，与原 read_eeg_data 保持一致 (4.5V 参考电压)
+UV_PER_CODE = 1000000 * 4.5 / 16777215
+
+# SPI命令集
+COMMANDS = {
+    'wakeup': 0x02,
+    'stop': 0x0A,
+    'start': 0x08,
+    'reset': 0x06,
+    'sdatac': 0x11,
+    'rdatac': 0x10,
+    'rdata': 0x12
+}
+
+
+def send_command(spi_dev, command):
+    spi_dev.xfer([command])
+
+
+def write_register(spi_dev, register, data):
+    write = 0x40
+    register_write = write | register
+    spi_dev.xfer([register_write, 0x00, data])
+
+
+def initialize_chips(devices):
+    for dev in devices:
+        send_command(dev, COMMANDS['wakeup'])
+        send_command(dev, COMMANDS['stop'])
+        send_command(dev, COMMANDS['reset'])
+        send_command(dev, COMMANDS['sdatac'])
+
+        write_register(dev, 0x14, 0x80)  # GPIO
+        write_register(dev, 0x01, 0x96)  # config1 (DAISY_EN=0: 菊花链模式, 250 SPS)
+        write_register(dev, 0x02, 0xD4)  # config2
+        write_register(dev, 0x03, 0xFF)  # config3
+
+        for reg in [0x04, 0x0D, 0x0E, 0x0F, 0x10, 0x11, 0x15, 0x17]:
+            write_register(dev, reg, 0x00)
+        for ch in range(5, 13):
+            write_register(dev, ch, 0x00)
+
+        send_command(dev, COMMANDS['rdatac'])
+        send_command(dev, COMMANDS['start'])
+
+
+def _as_uint8(buf):
+    # spidev.readbytes 返回 list，文件/共享内存读出的是 bytes 类对象
+    if isinstance(buf, (bytes, bytearray, memoryview)):
+        return np.frombuffer(buf, dtype=np.uint8)
+    return np.asarray(buf, dtype=np.uint8)
+
+
+def decode_codes(buf):
+    """
+    把包含一帧或多帧的原始字节解码为 24 位有符号 ADC 码
+
+    Args:
+        buf: 长度为 FRAME_SIZE 整数倍的 bytes / bytearray / list
+
+    Returns:
+        形状 (n_frames, 8) 的 int32 数组
+    """
+    raw = _as_uint8(buf)
+    if raw.size % FRAME_SIZE:
+        raise ValueError(f"数据长度 {raw.size} 不是帧长 {FRAME_SIZE} 的整数倍")
+
+    # (n_frames, 8, 3)，跳过每帧开头的状态字
+    samples = raw.reshape(-1, FRAME_SIZE)[:, STATUS_BYTES:].reshape(-1, CHANNELS, BYTES_PER_CHANNEL)
+    codes = (samples[..., 0].astype(np.int32) << 16) | (samples[..., 1].astype(np.int32) << 8) | samples[..., 2]
+
+    # 24 位补码符号扩展
+    codes -= (codes & 0x800000) << 1
+    return codes
+
+
+def decode_status(buf):
+    """
+    解出每帧的 24 位状态字
+
+    Returns:
+        形状 (n_frames,) 的 int32 数组，正常帧满足 status & STATUS_MASK == STATUS_HEADER
+    """
+    raw = _as_uint8(buf)
+    if raw.size % FRAME_SIZE:
+        raise ValueError(f"数据长度 {raw.size} 不是帧长 {FRAME_SIZE} 的整数倍")
+    status = raw.reshape(-1, FRAME_SIZE)[:, :STATUS_BYTES].astype(np.int32)
+    return (status[:, 0] << 16) | (status[:, 1] << 8) | status[:, 2]
+
+
+def decode_frames(buf):
+    """
+    一次性解码一帧或多帧 ADS1299 数据并换算为 µV
+
+    Args:
+        buf: 长度为 FRAME_SIZE 整数倍的 bytes / bytearray / list
+
+    Returns:
+        形状 (n_frames, 8) 的 float32 数组
+    """
+    return decode_codes(buf).astype(np.float32) * np.float32(UV_PER_CODE)
+
+
+def uv_to_codes(samples):
+    """把 µV 数值换算回 24 位 ADC 码 (超出量程的部分截断)"""
+    codes = np.rint(np.asarray(samples, dtype=np.float64) / UV_PER_CODE)
+    return np.clip(codes, -0x800000, 0x7FFFFF).astype(np.int32)
+
+
+def encode_frames(codes, status=STATUS_HEADER):
+    """
+    把 ADC 码编码为 ADS1299 原始帧，是 decode_codes 的逆过程
+
+    Args:
+        codes: 形状 (n, 8 × 芯片数) 的整数数组，每行按芯片顺序依次编码为帧
+        status: 每帧的 24 位状态字
+
+    Returns:
+        长度为 n × 芯片数 × FRAME_SIZE 的 bytes
+    """
+    codes = np.asarray(codes, dtype=np.int32).reshape(-1, CHANNELS) & 0xFFFFFF
+    frames = np.empty((len(codes), FRAME_SIZE), dtype=np.uint8)
+    frames[:, 0] = (status >> 16) & 0xFF
+    frames[:, 1] = (status >> 8) & 0xFF
+    frames[:, 2] = status & 0xFF
+    frames[:, 3::3] = codes >> 16
+    frames[:, 4::3] = (codes >> 8) & 0xFF
+    frames[:, 5::3] = codes & 0xFF
+    return frames.tobytes()
+
+
+# 两片 ADS1299 的一个样本 = 两帧首尾相接。菊花链模式下靠近 MISO 的芯片
+# (原 spi 0,0) 数据在前，因此无论是否菊花链，解码后的通道顺序都与
+# data_1 + data_2 相同
+DAISY_CHIPS = 2
+DAISY_FRAME_SIZE = DAISY_CHIPS * FRAME_SIZE
+
+
+def decode_daisy_frames(buf, chips=DAISY_CHIPS):
+    """
+    解码两片芯片拼接在一起的一个或多个样本
+
+    Returns:
+        形状 (n_samples, chips * 8) 的 float32 数组
+    """
+    return decode_frames(buf).reshape(-1, chips * CHANNELS)
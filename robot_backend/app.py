@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 import robot_interface as bot
 import math
 import sys
@@ -6,16 +6,31 @@ import threading
 import time
 import signal
 import os
+from time import perf_counter
+from metrics import CONTENT_TYPE, METRICS
+from async_log import configure_logging, get_logger, shutdown_logging
 
 app = Flask(__name__)
 
+# 控制回调和请求处理中的输出经后台队列写出，重复的记录每秒最多一条
+log = get_logger("robot")
+
 # 全局变量
 current_command = "freeze"
 previous_command = None
 robot = None
 controller = None
+last_control_tick = None
+command_received_at = None
+
+# 控制回调和 HTTP 请求的耗时 (GET /metrics 导出)
+CONTROL_SECONDS = METRICS.histogram("robot_control_seconds", "controlLogicCommandDriven 每次调用的耗时")
+CONTROL_INTERVAL = METRICS.histogram("robot_control_interval_seconds", "相邻两次控制回调的间隔")
+COMMAND_APPLY = METRICS.histogram("robot_command_apply_seconds", "/command 收到新命令到控制回调开始执行它的时间")
 
 def cleanup(signum, frame):
+    # 信号处理函数中直接 print：先写出队列中的日志，避免在被中断的线程持有队列锁时死锁
+    shutdown_logging()
     print("\nCleaning up...")
     if robot is not None:
         print("Stopping robot...")
@@ -74,12 +89,12 @@ class RobotController:
         # 0-1000ms: Lie down (mode 5)
         if 0 < time_ms < 1000:
             self.cmd.mode = 5  # Position stand down
-            print("Lying down (mode 5)")
+            log.info("Dance step", step="Lying down", mode=5)
             
         # 1000-2000ms: Stand up (mode 6)
         elif 1000 < time_ms < 2000:
             self.cmd.mode = 6  # Position stand up
-            print("Standing up (mode 6)")
+            log.info("Dance step", step="Standing up", mode=6)
             
         # 2000-3000ms: Turn left (mode 1)
         elif 2000 < time_ms < 3000:
@@ -87,14 +102,14 @@ class RobotController:
             my_euler = [0, 0, 0]
             my_euler[2] = -0.2
             self.cmd.euler = my_euler
-            print("Turning left (mode 1)")
+            log.info("Dance step", step="Turning left", mode=1)
             
         # 3000-4000ms: Reset position (mode 1)
         elif 3000 < time_ms < 4000:
             self.cmd.mode = 1  # Force stand
             my_euler = [0, 0, 0]  # Reset all angles to zero
             self.cmd.euler = my_euler
-            print("Resetting position (mode 1)")
+            log.info("Dance step", step="Resetting position", mode=1)
             
         # 4000-5000ms: Turn right (mode 1)
         elif 4000 < time_ms < 5000:
@@ -102,45 +117,45 @@ class RobotController:
             my_euler = [0, 0, 0]
             my_euler[2] = 0.2
             self.cmd.euler = my_euler
-            print("Turning right (mode 1)")
+            log.info("Dance step", step="Turning right", mode=1)
             
         # 5000-6000ms: Reset position (mode 1)
         elif 5000 < time_ms < 6000:
             self.cmd.mode = 1  # Force stand
             my_euler = [0, 0, 0]  # Reset all angles to zero
             self.cmd.euler = my_euler
-            print("Resetting position (mode 1)")
+            log.info("Dance step", step="Resetting position", mode=1)
             
         # 6000-7000ms: Walk forward (mode 2)
         elif 6000 < time_ms < 7000:
             self.cmd.mode = 2  # Target velocity walking
             my_velocity = [0.3, 0]  # Forward velocity
             self.cmd.velocity = my_velocity
-            print("Walking forward (mode 2)")
+            log.info("Dance step", step="Walking forward", mode=2)
             
         # 7000-8000ms: Walk backward (mode 2)
         elif 7000 < time_ms < 8000:
             self.cmd.mode = 2  # Target velocity walking
             my_velocity = [-0.3, 0]  # Backward velocity
             self.cmd.velocity = my_velocity
-            print("Walking backward (mode 2)")
+            log.info("Dance step", step="Walking backward", mode=2)
             
         # 8000-9000ms: Stop moving (mode 0)
         elif 8000 < time_ms < 9000:
             self.cmd.mode = 0  # Idle, default stand
-            print("Stopping movement (mode 0)")
+            log.info("Dance step", step="Stopping movement", mode=0)
             
         # 9000-10000ms: Sit down (mode 5)
         elif 9000 < time_ms < 10000:
             self.cmd.mode = 5  # Position stand down
-            print("Sitting down (mode 5)")
+            log.info("Dance step", step="Sitting down", mode=5)
             
         # After 10000ms: Stop running
         elif time_ms >= 10000:
             self.cmd.running_controller = False
             self.is_dancing = False  # 重置跳舞状态
             current_command = "freeze"  # 重置为freeze状态
-            print("Dance completed, resetting to freeze mode")
+            log.info("Dance completed, resetting to freeze mode")
 
     def call_freeze(self):
         if not self.is_dancing:  # 只有在不在跳舞状态时才执行freeze
@@ -158,10 +173,15 @@ class RobotController:
         return self.cmd
 
 def controlLogicCommandDriven(state, init_state, time):
-    global current_command, previous_command
+    global current_command, previous_command, last_control_tick, command_received_at
+    # 参数 time 是机器人时钟 (毫秒)，耗时用单调时钟 perf_counter 测量
+    start = perf_counter()
+    if last_control_tick is not None:
+        CONTROL_INTERVAL.observe(start - last_control_tick)
+    last_control_tick = start
     time_sec = time / 1000
 
-    print(f"Control loop - Current command: {current_command}")  # 调试信息
+    log.debug("Control loop", command=current_command)  # 调试信息
     if current_command == "dance":
         controller.call_dance(time_sec)
     elif current_command == "freeze":
@@ -170,10 +190,15 @@ def controlLogicCommandDriven(state, init_state, time):
         controller.call_stop()
 
     if current_command != previous_command:
-        print(f"🔄 Executing Command: {current_command.upper()}")
+        log.info("🔄 Executing command", rate_limit=False, command=current_command, previous=previous_command)
         previous_command = current_command
+        if command_received_at is not None:
+            COMMAND_APPLY.observe(start - command_received_at)
+            command_received_at = None
 
-    return controller.get_cmd()
+    cmd = controller.get_cmd()
+    CONTROL_SECONDS.observe(perf_counter() - start)
+    return cmd
 
 def init_robot():
     global robot, controller
@@ -183,39 +208,49 @@ def init_robot():
     for attempt in range(max_retries):
         try:
             if robot is None:
-                print(f"Attempting to connect to robot (attempt {attempt + 1}/{max_retries})...")
+                log.info("Attempting to connect to robot", attempt=attempt + 1, max_retries=max_retries)
                 robot = bot.HIGO1_("192.168.123.161")
                 controller = RobotController()
                 robot.set_controller(controlLogicCommandDriven)
-                print("Robot connected successfully!")
+                log.info("Robot connected successfully!")
                 robot.run()
                 return True
         except Exception as e:
-            print(f"Error connecting to robot (attempt {attempt + 1}/{max_retries}): {str(e)}")
+            log.error("Error connecting to robot", attempt=attempt + 1, max_retries=max_retries, error=str(e))
             if attempt < max_retries - 1:
-                print(f"Retrying in {retry_delay} seconds...")
+                log.info("Retrying", delay_s=retry_delay)
                 time.sleep(retry_delay)
             else:
-                print("Failed to connect to robot after maximum retries")
+                log.error("Failed to connect to robot after maximum retries")
                 return False
     return False
 
 def run_robot():
     if not init_robot():
-        print("Robot initialization failed. Please check the connection and try again.")
+        log.error("Robot initialization failed. Please check the connection and try again.")
         return
 
 def run_flask():
-    print("Starting Flask server...")
+    log.info("Starting Flask server...")
     app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False)
 
+@app.before_request
+def start_request_timer():
+    g.request_start = perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    METRICS.histogram("http_request_seconds", "HTTP 请求处理耗时", handler=request.endpoint or "unknown",
+                      status=response.status_code).observe(perf_counter() - g.request_start)
+    return response
+
 @app.route('/command', methods=['POST'])
 def set_command():
-    global current_command
-    print("Received command request")  # 调试信息
+    global current_command, command_received_at
+    log.debug("Received command request")  # 调试信息
     try:
         data = request.json
-        print(f"Received data: {data}")  # 调试信息
+        log.debug("Received data", data=data)  # 调试信息
         if data and 'command' in data:
             new_command = data['command']
             if controller.is_dancing and new_command != "dance":  # 如果在跳舞且新命令不是dance
@@ -224,7 +259,9 @@ def set_command():
                     "message": "Dance in progress, command ignored",
                     "current_command": current_command
                 })
-            print(f"Setting command to: {new_command}")  # 调试信息
+            log.info("Setting command", command=new_command)
+            if new_command != current_command:
+                command_received_at = perf_counter()
             current_command = new_command
             return jsonify({
                 "status": "success", 
@@ -237,7 +274,7 @@ def set_command():
             "received_data": data
         }), 400
     except Exception as e:
-        print(f"Error processing command: {str(e)}")  # 调试信息
+        log.error("Error processing command", error=str(e))
         return jsonify({
             "status": "error",
             "message": f"Error processing command: {str(e)}"
@@ -251,14 +288,20 @@ def get_status():
         "robot_connected": robot is not None,
         "controller_initialized": controller is not None
     }
-    print(f"Status request - Current state: {status}")  # 调试信息
+    log.debug("Status request", **status)  # 调试信息
     return jsonify(status)
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Prometheus 文本格式: 控制回调、命令生效延迟和 HTTP 请求耗时
+    return Response(METRICS.render(), content_type=CONTENT_TYPE)
+
 if __name__ == '__main__':
-    print("Starting robot control system...")
-    print("Make sure the robot is powered on and connected to the network.")
-    print("Robot IP: 192.168.123.161")
-    print("Press Ctrl+Z to stop the program and clean up ports")
+    configure_logging(os.environ.get("LOG_LEVEL", "INFO"), json_lines=os.environ.get("LOG_JSON") == "1")
+    log.info("Starting robot control system...")
+    log.info("Make sure the robot is powered on and connected to the network.")
+    log.info("Robot IP: 192.168.123.161")
+    log.info("Press Ctrl+Z to stop the program and clean up ports")
     
     # 启动Flask服务器线程
     flask_thread = threading.Thread(target=run_flask)
@@ -0,0 +1,224 @@
+import queue
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+from ads1299 import SAMPLE_RATE, UV_PER_CODE
+
+# 文件结构: 文件头 | 数据块 ... | 块索引 | 文件尾
+# 每个数据块保存 chunk_size 个样本的 24 位 ADC 码 (按通道做时间差分) 和时间戳，
+# 字节重排后用 zlib 压缩；块索引记录每块的起止时间和偏移，支持按时间随机读取
+MAGIC = b"EEGARC01"
+VERSION = 1
+HEADER = struct.Struct("<8sHHIdd")
+CHUNK_HEADER = struct.Struct("<IId")
+FOOTER = struct.Struct("<qq8s")
+INDEX_DTYPE = np.dtype([
+    ('t_start', '<f8'),
+    ('t_end', '<f8'),
+    ('first_sample', '<i8'),
+    ('offset', '<i8'),
+    ('n_samples', '<i4'),
+    ('nbytes', '<i4'),
+])
+
+
+def _shuffle(values):
+    # 按字节位重排 (所有值的第 0 字节、第 1 字节 ...)，差分后的小整数高位几乎全为 0，压缩率更高
+    return np.ascontiguousarray(values.view(np.uint8).reshape(-1, values.dtype.itemsize).T).tobytes()
+
+
+def _unshuffle(buf, dtype, count):
+    itemsize = np.dtype(dtype).itemsize
+    raw = np.frombuffer(buf, dtype=np.uint8, count=count * itemsize).reshape(itemsize, count)
+    return np.ascontiguousarray(raw.T).view(dtype).reshape(-1)
+
+
+def encode_chunk(codes, timestamps, level=1):
+    """把 (n, channels) 的 ADC 码和 n 个时间戳编码为一个压缩块"""
+    n = len(codes)
+    deltas = np.empty_like(codes, dtype=np.int32)
+    deltas[0] = codes[0]
+    np.subtract(codes[1:], codes[:-1], out=deltas[1:])
+
+    # 时间戳以块首时间为基准，按微秒取整后差分
+    t0 = float(timestamps[0])
+    offsets = np.rint((np.asarray(timestamps, dtype=np.float64) - t0) * 1e6).astype(np.int32)
+    offsets[1:] = np.diff(offsets)
+
+    payload = zlib.compress(_shuffle(deltas) + _shuffle(offsets), level)
+    return CHUNK_HEADER.pack(n, len(payload), t0) + payload
+
+
+def decode_chunk(buf, channels):
+    """encode_chunk 的逆过程，返回 (codes, timestamps)"""
+    n, nbytes, t0 = CHUNK_HEADER.unpack_from(buf)
+    raw = zlib.decompress(buf[CHUNK_HEADER.size:CHUNK_HEADER.size + nbytes])
+    split = n * channels * 4
+    codes = np.cumsum(_unshuffle(raw[:split], np.int32, n * channels).reshape(n, channels), axis=0, dtype=np.int32)
+    offsets = np.cumsum(_unshuffle(raw[split:], np.int32, n), dtype=np.int64)
+    return codes, t0 + offsets / 1e6
+
+
+class ArchiveWriter:
+    """
+    长时间会话的压缩归档写入器
+
+    write() 只把样本拷入预分配的块缓冲区，块写满后交给后台线程压缩并写盘，
+    因此可以直接在采集线程中调用。
+
+    Args:
+        path: 归档文件路径
+        channels: 通道数
+        sample_rate: 采样率，写入文件头
+        chunk_size: 每块的样本数
+        level: zlib 压缩级别
+    """
+
+    def __init__(self, path, channels=16, sample_rate=SAMPLE_RATE, chunk_size=10 * SAMPLE_RATE, level=1):
+        self.path = path
+        self.channels = channels
+        self.chunk_size = chunk_size
+        self.level = level
+        self.n_samples = 0
+        self._codes = np.empty((chunk_size, channels), dtype=np.int32)
+        self._timestamps = np.empty(chunk_size, dtype=np.float64)
+        self._fill = 0
+        self._index = []
+
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION, channels, chunk_size, sample_rate, UV_PER_CODE))
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="archive-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, codes, timestamp):
+        self._codes[self._fill] = codes
+        self._timestamps[self._fill] = timestamp
+        self._fill += 1
+        if self._fill == self.chunk_size:
+            self._submit()
+
+    def append(self, codes, timestamps):
+        i = 0
+        while i < len(codes):
+            n = min(len(codes) - i, self.chunk_size - self._fill)
+            self._codes[self._fill:self._fill + n] = codes[i:i + n]
+            self._timestamps[self._fill:self._fill + n] = timestamps[i:i + n]
+            self._fill += n
+            i += n
+            if self._fill == self.chunk_size:
+                self._submit()
+
+    def _submit(self):
+        if self._fill:
+            self._queue.put((self.n_samples, self._codes[:self._fill].copy(), self._timestamps[:self._fill].copy()))
+            self.n_samples += self._fill
+            self._fill = 0
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            first_sample, codes, timestamps = item
+            chunk = encode_chunk(codes, timestamps, self.level)
+            self._index.append((timestamps[0], timestamps[-1], first_sample, self._file.tell(),
+                                len(codes), len(chunk)))
+            self._file.write(chunk)
+
+    def close(self):
+        self._submit()
+        self._queue.put(None)
+        self._thread.join()
+        index_offset = self._file.tell()
+        self._file.write(np.array(self._index, dtype=INDEX_DTYPE).tobytes())
+        self._file.write(FOOTER.pack(index_offset, len(self._index), MAGIC))
+        self._file.close()
+
+
+def is_archive(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class ArchiveReader:
+    """
+    压缩归档的随机访问读取器
+
+    按块解压，最近使用的块会被缓存，顺序读取时每块只解压一次。
+    切片 reader[a:b] 返回 µV (与 recorder 的 data 相同)，codes(a, b) 返回原始 ADC 码。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        magic, version, self.channels, self.chunk_size, self.sample_rate, self.uv_per_code = \
+            HEADER.unpack(self._file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} 不是 EEG 归档文件")
+        if version != VERSION:
+            raise ValueError(f"不支持的归档文件版本: {version}")
+
+        self._file.seek(-FOOTER.size, 2)
+        index_offset, n_chunks, end_magic = FOOTER.unpack(self._file.read(FOOTER.size))
+        if end_magic != MAGIC:
+            raise ValueError(f"{path} 未正常关闭，缺少块索引")
+        self._file.seek(index_offset)
+        self.index = np.frombuffer(self._file.read(n_chunks * INDEX_DTYPE.itemsize), dtype=INDEX_DTYPE)
+        self.n_samples = int(self.index['n_samples'].sum()) if n_chunks else 0
+        self._cached = None
+
+    def __len__(self):
+        return self.n_samples
+
+    def chunk(self, i):
+        """解压第 i 块，返回 (codes, timestamps)"""
+        if self._cached is not None and self._cached[0] == i:
+            return self._cached[1]
+        entry = self.index[i]
+        self._file.seek(int(entry['offset']))
+        decoded = decode_chunk(self._file.read(int(entry['nbytes'])), self.channels)
+        self._cached = (i, decoded)
+        return decoded
+
+    def read(self, start, stop):
+        """读取样本 [start, stop) 的 (codes, timestamps)"""
+        start, stop = max(0, start), min(stop, self.n_samples)
+        if start >= stop:
+            return np.zeros((0, self.channels), dtype=np.int32), np.zeros(0)
+        first = np.searchsorted(self.index['first_sample'], start, side='right') - 1
+        last = np.searchsorted(self.index['first_sample'], stop, side='left')
+        codes, timestamps = [], []
+        for i in range(first, last):
+            c, t = self.chunk(i)
+            lo = max(start - int(self.index['first_sample'][i]), 0)
+            hi = min(stop - int(self.index['first_sample'][i]), len(c))
+            codes.append(c[lo:hi])
+            timestamps.append(t[lo:hi])
+        if len(codes) == 1:
+            return codes[0], timestamps[0]
+        return np.concatenate(codes), np.concatenate(timestamps)
+
+    def read_time(self, t_start, t_end):
+        """按单调时间戳读取 [t_start, t_end) 内的 (codes, timestamps)"""
+        first = max(np.searchsorted(self.index['t_end'], t_start, side='left'), 0)
+        last = np.searchsorted(self.index['t_start'], t_end, side='left')
+        if first >= last:
+            return self.read(0, 0)
+        codes, timestamps = self.read(int(self.index['first_sample'][first]),
+                                      int(self.index['first_sample'][last - 1] + self.index['n_samples'][last - 1]))
+        mask = (timestamps >= t_start) & (timestamps < t_end)
+        return codes[mask], timestamps[mask]
+
+    def codes(self, start, stop):
+        return self.read(start, stop)[0]
+
+    def __getitem__(self, item):
+        start, stop, step = item.indices(self.n_samples)
+        return self.codes(start, stop)[::step].astype(np.float32) * np.float32(self.uv_per_code)
+
+    def close(self):
+        self._file.close()
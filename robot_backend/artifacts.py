@@ -0,0 +1,123 @@
+import numpy as np
+
+from ads1299 import SAMPLE_RATE, UV_PER_CODE
+
+# 每个通道的伪迹标志位
+RAILED = 1
+FLAT = 2
+SPIKE = 4
+NOISE = 8
+FLAG_NAMES = {RAILED: 'railed', FLAT: 'flat', SPIKE: 'spike', NOISE: 'noise'}
+
+# 24 位 ADC 满量程对应的 µV，电极脱落或饱和时读数贴近 ±RAIL_UV
+RAIL_UV = 0x7FFFFF * UV_PER_CODE
+
+
+class ArtifactDetector:
+    """
+    向量化的伪迹检测，用于在推理前拦截无效窗口
+
+    对 (n, channels) 的窗口一次性判断所有通道:
+        railed: 任一样本接近 ADC 满量程 (电极脱落 / 放大器饱和)
+        flat:   峰峰值低于 flat_uv (通道短路或无信号)
+        spike:  相邻样本跳变超过 spike_uv (运动、接触不良)
+        noise:  一阶差分 RMS 与去均值信号 RMS 之比超过 hf_ratio (高频噪声为主)
+
+    坏通道数超过 max_bad_channels 的窗口被拒绝，accepted / skipped 和各标志的
+    计数可随时读取。
+
+    Args:
+        sample_rate: 采样率
+        window_size: check_ring 使用的窗口长度 (样本数)
+        rail_fraction: 视为饱和的满量程比例
+        flat_uv: 平直判定阈值 (µV, 峰峰值)
+        spike_uv: 跳变判定阈值 (µV, 相邻样本之差)
+        hf_ratio: 高频噪声判定阈值
+        max_bad_channels: 允许的坏通道数
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, window_size=SAMPLE_RATE // 2, rail_fraction=0.95, flat_uv=0.5,
+                 spike_uv=200.0, hf_ratio=1.0, max_bad_channels=0):
+        self.sample_rate = sample_rate
+        self.window_size = window_size
+        self.rail_uv = rail_fraction * RAIL_UV
+        self.flat_uv = flat_uv
+        self.spike_uv = spike_uv
+        self.hf_ratio = hf_ratio
+        self.max_bad_channels = max_bad_channels
+        self.min_samples = max(2, window_size // 4)
+        self.accepted = 0
+        self.skipped = 0
+        self.overwritten = 0
+        self.counts = dict.fromkeys(FLAG_NAMES.values(), 0)
+        self.last_flags = None
+
+    def channel_flags(self, window):
+        """
+        Returns:
+            形状 (channels,) 的 uint8 标志位数组
+        """
+        window = np.asarray(window, dtype=np.float32)
+        flags = np.zeros(window.shape[1], dtype=np.uint8)
+        flags[np.any(np.abs(window) >= self.rail_uv, axis=0)] |= RAILED
+        # 样本太少时峰峰值和噪声比没有统计意义 (例如刚开始采集)，只检查饱和
+        if len(window) >= self.min_samples:
+            flags[np.ptp(window, axis=0) < self.flat_uv] |= FLAT
+            diff = np.diff(window, axis=0)
+            flags[np.max(np.abs(diff), axis=0) > self.spike_uv] |= SPIKE
+            diff_rms = np.sqrt(np.mean(diff * diff, axis=0))
+            centered = window - window.mean(axis=0)
+            signal_rms = np.sqrt(np.mean(centered * centered, axis=0))
+            flags[diff_rms > self.hf_ratio * signal_rms] |= NOISE
+        return flags
+
+    def check(self, window):
+        """
+        检查一个窗口并更新计数
+
+        Returns:
+            True 表示窗口可用于推理
+        """
+        flags = self.channel_flags(window)
+        self.last_flags = flags
+        for bit, name in FLAG_NAMES.items():
+            self.counts[name] += int(np.count_nonzero(flags & bit))
+        if np.count_nonzero(flags) > self.max_bad_channels:
+            self.skipped += 1
+            return False
+        self.accepted += 1
+        return True
+
+    def check_ring(self, ring, end=None):
+        """
+        检查环形缓冲区中截至序号 end 的最近 window_size 个样本 (零拷贝)
+
+        读者落后时窗口中已被覆盖的样本不参与检查；整个窗口都已被覆盖时计为跳过 (overwritten)。
+        """
+        while True:
+            head = ring.head
+            stop = head if end is None else min(end, head)
+            start = max(stop - self.window_size, head - ring.capacity, 0)
+            if start >= stop:
+                self.last_flags = None
+                self.overwritten += 1
+                self.skipped += 1
+                return False
+            try:
+                window = ring.window(stop - start, end=stop)[0]
+            except IndexError:
+                # 取窗口前写入者又覆盖了窗口起点，按新的 head 重新计算
+                continue
+            return self.check(window)
+
+    def bad_channels(self):
+        """上一次检查中被标记的通道及其原因"""
+        if self.last_flags is None:
+            return {}
+        return {int(ch): [name for bit, name in FLAG_NAMES.items() if flag & bit]
+                for ch, flag in enumerate(self.last_flags) if flag}
+
+    def snapshot(self):
+        total = self.accepted + self.skipped
+        return dict(accepted=self.accepted, skipped=self.skipped, overwritten=self.overwritten,
+                    skip_rate=self.skipped / total if total else 0.0, **self.counts)
@@ -0,0 +1,232 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import multiprocessing.util
+import os
+import queue
+import sys
+import threading
+import time
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    输出 "时间 级别 logger 事件 key=value ..."，json_lines=True 时每条记录一行 JSON
+
+    字段来自 EventLogger 的关键字参数 (record.fields)。
+    """
+
+    def __init__(self, json_lines=False):
+        super(StructuredFormatter, self).__init__()
+        self.json_lines = json_lines
+
+    def format(self, record):
+        fields = getattr(record, 'fields', None) or {}
+        if self.json_lines:
+            entry = {'time': round(record.created, 6), 'level': record.levelname, 'logger': record.name,
+                     'event': record.getMessage()}
+            entry.update(fields)
+            if record.exc_info:
+                entry['exception'] = self.formatException(record.exc_info)
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+        clock = time.strftime('%H:%M:%S', time.localtime(record.created))
+        line = f"{clock}.{int(record.msecs):03d} {record.levelname:<7} {record.name} {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{k}={_format_value(v)}" for k, v in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    text = str(value)
+    return f'"{text}"' if ' ' in text else text
+
+
+class RateLimiter:
+    """
+    合并重复的记录: 同一 logger、事件和字段的记录每 interval 秒最多输出一条，
+    下一条输出时带上期间被合并的条数 (repeated)。
+
+    在创建 LogRecord 之前检查，被合并的调用只有一次字典查找的开销。
+    """
+
+    def __init__(self, interval=1.0, max_keys=1024):
+        self.interval = interval
+        self.max_keys = max_keys
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def check(self, name, event, fields):
+        """
+        Returns:
+            None 表示这条记录被合并 (不输出)，否则为上次输出以来被合并的条数
+        """
+        if self.interval <= 0:
+            return 0
+        try:
+            key = (name, event, tuple(fields.items()))
+            hash(key)
+        except TypeError:
+            key = (name, event, repr(fields))
+        now = time.monotonic()
+        with self._lock:
+            state = self._seen.get(key)
+            if state is not None and now - state[0] < self.interval:
+                state[1] += 1
+                return None
+            self._seen[key] = [now, 0]
+            if len(self._seen) > self.max_keys:
+                # 丢弃已经过了间隔的键，防止字段取值很多时无限增长
+                self._seen = {k: v for k, v in self._seen.items() if now - v[0] < self.interval}
+        return state[1] if state is not None else 0
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    只把记录放进有界队列，格式化和写出都在后台线程中进行
+
+    队列满时丢弃记录并计数 (dropped)，调用线程不会因为终端或 SSH 输出慢而阻塞。
+    消息参数在后台线程中才合并，传入的参数在记录输出前不应再被修改。
+    """
+
+    def __init__(self, queue_):
+        super(AsyncQueueHandler, self).__init__(queue_)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # 队列满时等待后台线程腾出位置，保证结束标记能放进去
+        self.queue.put(self._sentinel)
+
+
+_handler = None
+_listener = None
+_limiter = RateLimiter()
+_configure_lock = threading.Lock()
+# 最近一次 configure_logging 的参数，fork 出的子进程按相同配置重新启动后台线程
+_settings = {}
+_finalizer_pid = None
+
+
+def configure_logging(level="INFO", json_lines=False, stream=None, rate_limit_s=1.0, queue_size=10000):
+    """
+    把根 logger 的输出改为经后台队列异步写出 (已配置时先停止原来的后台线程)
+
+    Args:
+        level: 日志级别
+        json_lines: 为 True 时每条记录输出一行 JSON
+        stream: 输出流，默认为 sys.stdout
+        rate_limit_s: 重复记录的合并间隔 (秒)，0 表示不合并
+        queue_size: 队列容量 (条)
+    """
+    global _handler, _listener, _limiter, _settings, _finalizer_pid
+    with _configure_lock:
+        if _finalizer_pid != os.getpid():
+            # multiprocessing 的子进程以 os._exit 结束，不执行 atexit，改由它的退出清理写出剩余记录
+            multiprocessing.util.Finalize(None, shutdown_logging, exitpriority=0)
+            _finalizer_pid = os.getpid()
+        _settings = dict(level=level, json_lines=json_lines, stream=stream, rate_limit_s=rate_limit_s,
+                         queue_size=queue_size)
+        root = logging.getLogger()
+        if _listener is not None:
+            _listener.stop()
+            root.removeHandler(_handler)
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(StructuredFormatter(json_lines))
+        _handler = AsyncQueueHandler(queue.Queue(queue_size))
+        _limiter = RateLimiter(rate_limit_s)
+        _listener = _QueueListener(_handler.queue, output)
+        _listener.start()
+        root.addHandler(_handler)
+        root.setLevel(level)
+    return _handler
+
+
+def shutdown_logging():
+    """写出队列中剩余的记录并停止后台线程"""
+    global _handler, _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            logging.getLogger().removeHandler(_handler)
+            _handler = None
+            _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+def _after_fork():
+    # 子进程中没有父进程的后台线程，继承的队列不会被写出：丢弃它，下次输出时按相同配置重新启动
+    global _handler, _listener, _configure_lock
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+    _handler = None
+    _listener = None
+    _configure_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def dropped_records():
+    """队列满时被丢弃的记录数"""
+    return _handler.dropped if _handler is not None else 0
+
+
+class EventLogger:
+    """
+    结构化日志: log.info("事件", key=value, ...)
+
+    第一次输出时若尚未调用 configure_logging 则按默认配置启动后台线程 (fork 出的子进程沿用父进程的配置)。
+    重复的记录按 RateLimiter 合并，rate_limit=False 的记录 (例如状态改变) 不合并。
+    """
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+
+    def log(self, level, event, rate_limit=True, exc_info=None, **fields):
+        if _listener is None:
+            configure_logging(**_settings)
+        if not self.logger.isEnabledFor(level):
+            return
+        if rate_limit:
+            repeated = _limiter.check(self.logger.name, event, fields)
+            if repeated is None:
+                return
+            if repeated:
+                fields['repeated'] = repeated
+        self.logger.log(level, event, exc_info=exc_info, extra={'fields': fields})
+
+    def debug(self, event, **fields):
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event, **fields):
+        self.log(logging.ERROR, event, **fields)
+
+
+def get_logger(name):
+    return EventLogger(name)
@@ -1,34 +1,95 @@
-import spidev
 import time
-import gpiod
 import threading
-from bluezero import peripheral
 import json
+import struct
+import numpy as np
+from acquisition import AcquisitionThread, set_thread_affinity
+from eeg_devices import HardwareDevice
+from ring_buffer import EEGRingBuffer
+
+# 推送方式: latest 每次推送最新的一个样本，stream 按 MTU 把连续样本打包推送
+BLE_MODES = ("latest", "stream")
+
+# ATT 通知的操作码和句柄占用 3 字节，每个通知最多携带 MTU - 3 字节
+ATT_HEADER_SIZE = 3
+# iOS 协商的 ATT MTU 通常为 185，Android 可以请求到 517
+DEFAULT_MTU = 185
+
+# stream 模式的包头 (大端): 版本、样本数、首个样本序号 (uint32)、
+# 首个样本时间戳 (推送开始以来的微秒，uint64)，之后为样本数 × 48 字节
+PACKET_VERSION = 1
+PACKET_HEADER = struct.Struct(">BBIQ")
+
+
+def to_bytes(value):
+    """24 位补码，大端"""
+    if value < 0:
+        value = (1 << 24) + value
+    return int(value).to_bytes(3, 'big', signed=False)
+
+
+def pack_sample(sample):
+    """16 通道样本 (µV) -> 48 字节的 BLE 通知数据"""
+    return b''.join(to_bytes(int(x)) for x in sample)
+
+
+def pack_samples(samples):
+    """(n, 16) 样本 (µV) -> n * 48 字节，逐值与 pack_sample 相同 (24 位补码，大端)"""
+    values = np.asarray(samples).astype(np.int64) & 0xFFFFFF
+    out = np.empty(values.shape + (3,), dtype=np.uint8)
+    out[..., 0] = values >> 16
+    out[..., 1] = (values >> 8) & 0xFF
+    out[..., 2] = values & 0xFF
+    return out.tobytes()
+
+
+def samples_per_packet(mtu, channels=16):
+    """一个通知能装下的样本数"""
+    n = (mtu - ATT_HEADER_SIZE - PACKET_HEADER.size) // (3 * channels)
+    if n < 1:
+        raise ValueError(f"MTU {mtu} 装不下一个样本 (至少需要 {ATT_HEADER_SIZE + PACKET_HEADER.size + 3 * channels})")
+    return min(n, 255)
+
+
+def pack_packet(seq, timestamp_us, samples):
+    """
+    stream 模式的一个通知
+
+    Args:
+        seq: 首个样本的序号 (取低 32 位)
+        timestamp_us: 首个样本的时间戳 (微秒)
+        samples: (n, 16) 连续样本，n 不超过 samples_per_packet(mtu)
+    """
+    header = PACKET_HEADER.pack(PACKET_VERSION, len(samples), int(seq) & 0xFFFFFFFF, max(0, int(timestamp_us)))
+    return header + pack_samples(samples)
 
 
 class EEGRecorderBLE:
-    def __init__(self, interval_ms=200):
-        # 初始化 SPI
+    def __init__(self, interval_ms=None, daisy=False, device=None, acquisition_cpus=None, io_cpus=None,
+                 mode="latest", mtu=DEFAULT_MTU):
+        if mode not in BLE_MODES:
+            raise ValueError(f"不支持的推送方式: {mode}")
+        self.mode = mode
+        # 推送间隔: latest 默认 200 ms；stream 默认 20 ms，每次推送期间采集到的整包样本
+        if interval_ms is None:
+            interval_ms = 200 if mode == "latest" else 20
         self.interval = interval_ms / 1000
-        self.spi = spidev.SpiDev()
-        self.spi_2 = spidev.SpiDev()
-        self.spi.open(0, 0)
-        self.spi_2.open(0, 1)
-        self.spi.max_speed_hz = 4000000
-        self.spi_2.max_speed_hz = 4000000
-        self.spi.mode = 0b01
-        self.spi_2.mode = 0b01
-        self.spi.bits_per_word = 8
-        self.spi_2.bits_per_word = 8
-
-        # 初始化 CS 引脚
-        chip = gpiod.chip("0")
-        self.cs_line = chip.get_line(19)
-        cs_line_out = gpiod.line_request()
-        cs_line_out.consumer = "SPI_CS"
-        cs_line_out.request_type = gpiod.line_request.DIRECTION_OUTPUT
-        self.cs_line.request(cs_line_out)
-        self.cs_line.set_value(1)
+        # stream 模式: 协商后的 ATT MTU 决定每个通知的样本数
+        self.mtu = mtu
+        self.packet_samples = samples_per_packet(mtu)
+        self.packets = 0
+        self.samples_sent = 0
+        # 采集线程和 BLE 推送线程绑定的 CPU 核 (None 表示不绑定)
+        self.acquisition_cpus = acquisition_cpus
+        self.io_cpus = io_cpus
+
+        # 采集后端，默认为两片 ADS1299 硬件 (菊花链模式下一次传输读出 16 通道)
+        if device is None:
+            device = HardwareDevice(daisy=daisy)
+        self.device = device
+        # 每次推送最多的包数: 一个间隔内采集样本数的两倍 (向上取整到整包)，
+        # 落后时以两倍实时速率追上，而不是一次性塞满 BlueZ 的发送队列
+        self.max_packets = int(np.ceil(2 * self.device.sample_rate * self.interval / self.packet_samples))
 
         # # 初始化按钮（可选）
         # button_pin_1 = 26
@@ -39,19 +100,17 @@ class EEGRecorderBLE:
         # line_1.request(button_req)
         # self.line_1 = line_1
 
-        # ADS1299 控制指令
-        self.COMMANDS = {
-            'wakeup': 0x02,
-            'stop': 0x0A,
-            'start': 0x08,
-            'reset': 0x06,
-            'sdatac': 0x11,
-            'rdatac': 0x10,
-            'rdata': 0x12
-        }
-
         # 配置 ADS1299 两个通道
-        self._initialize_spi_devices()
+        self.device.start()
+
+        # 采集线程按 DRDY 读取每一个样本写入环形缓冲区
+        self.ring = EEGRingBuffer(capacity=10 * self.device.sample_rate)
+        self.acquisition = None
+        self.timer = None
+        self.streamer = None
+        self._stop = threading.Event()
+        # 最近一次通知的数据，GATT 读取时返回
+        self.last_payload = bytes(48)
 
         # ==== BLE ====
         self.device_name = "EEGPi"
@@ -59,55 +118,10 @@ class EEGRecorderBLE:
         self.char_uuid = "12345678-1234-5678-1234-56789abcdef1"
         self._setup_ble()
 
-    def _send_command(self, spi_dev, command):
-        spi_dev.xfer([command])
-
-    def _write_register(self, spi_dev, register, data):
-        write = 0x40
-        register_write = write | register
-        spi_dev.xfer([register_write, 0x00, data])
-
-    def _initialize_spi_devices(self):
-        for dev in [self.spi, self.spi_2]:
-            self._send_command(dev, self.COMMANDS['wakeup'])
-            self._send_command(dev, self.COMMANDS['stop'])
-            self._send_command(dev, self.COMMANDS['reset'])
-            self._send_command(dev, self.COMMANDS['sdatac'])
-
-            self._write_register(dev, 0x14, 0x80)  # GPIO
-            self._write_register(dev, 0x01, 0x96)  # config1
-            self._write_register(dev, 0x02, 0xD4)  # config2
-            self._write_register(dev, 0x03, 0xFF)  # config3
-
-            for reg in [0x04, 0x0D, 0x0E, 0x0F, 0x10, 0x11, 0x15, 0x17]:
-                self._write_register(dev, reg, 0x00)
-            for ch in range(5, 13):
-                self._write_register(dev, ch, 0x00)
-
-            self._send_command(dev, self.COMMANDS['rdatac'])
-            self._send_command(dev, self.COMMANDS['start'])
-
-    def _read_eeg_data(self, spi_dev):
-        output = spi_dev.readbytes(27)
-        result = [0] * 8
-        for a in range(3, 25, 3):
-            voltage = (output[a] << 16) | (output[a + 1] << 8) | output[a + 2]
-            data_test = 0x7FFFFF
-            data_check = 0xFFFFFF
-
-            convert_voltage = voltage | data_test
-            if convert_voltage == data_check:
-                voltage_after_convert = (voltage - 16777214)
-            else:
-                voltage_after_convert = voltage
-
-            channel_num = int((a - 3) / 3)
-            if 0 <= channel_num < 8:
-                result[channel_num] = round(1000000 * 4.5 * (voltage_after_convert / 16777215), 2)
-
-        return result
-
     def _setup_ble(self):
+        # 只有真正广播时才需要 bluezero
+        from bluezero import peripheral
+
         self.ble = peripheral.Peripheral(
             adapter_address="2C:CF:67:97:03:4B",
             local_name=self.device_name
@@ -126,50 +140,107 @@ class EEGRecorderBLE:
         self.ble.on_disconnect = self.on_disconnect
 
     def read_callback(self):
-        return self.result
+        # 与特征值的初始值 [0] * 48 相同的格式 (字节值列表)
+        return list(self.last_payload)
 
-    def read_16ch_data(self):
-        # 读取两个 SPI 设备的数据
-        data_1 = self._read_eeg_data(self.spi)
-        self.cs_line.set_value(0)
-        data_2 = self._read_eeg_data(self.spi_2)
-        self.cs_line.set_value(1)
-
-        # 合并两个设备的数据
-        eeg_data = data_1 + data_2
-        return eeg_data
+    def _notify(self, payload):
+        self.last_payload = payload
+        self.characteristic.set_value(payload)
 
     def to_bytes(self, value):
-        if value < 0:
-            value = (1 << 24) + value
-        return int(value).to_bytes(3, 'big', signed=False)
+        return to_bytes(value)
 
     def start(self):
         print(f"🚀 Advertising as '{self.device_name}'")
-        threading.Thread(target=self.ble.publish, daemon=True).start()
+        threading.Thread(target=self._publish, daemon=True).start()
         print("🔍 等待连接...")
         while not self.ble.characteristics:
             time.sleep(0.1)
         self.characteristic = self.ble.characteristics[0]
         print("✅ BLE 服务准备就绪，开始推送")
-        self._schedule()
+        self.acquisition = AcquisitionThread(self.device, self.ring.write, cpus=self.acquisition_cpus)
+        self.acquisition.start()
+        try:
+            # 只需开启一次通知，之后每次 set_value 都会发出通知
+            self.characteristic.StartNotify()
+        except Exception as e:
+            print("❌ Notify error:", e)
+        if self.mode == "stream":
+            print(f"📦 MTU {self.mtu}: 每个通知 {self.packet_samples} 个样本，每 {self.interval * 1000:.0f} ms 推送")
+            self.streamer = threading.Thread(target=self._stream, name="ble-stream", daemon=True)
+            self.streamer.start()
+        else:
+            self._schedule()
+
+    def _publish(self):
+        set_thread_affinity(self.io_cpus)
+        self.ble.publish()
 
     def _schedule(self):
+        set_thread_affinity(self.io_cpus)
         try:
-            eeg = self.read_16ch_data()
-            data_bytes = b''.join(self.to_bytes(int(x)) for x in eeg)
-            self.characteristic.set_value(data_bytes)
-            self.characteristic.StartNotify()
+            # 推送采集线程最新的样本
+            if self.ring.head:
+                eeg = self.ring.window(1)[0][0]
+                data_bytes = pack_sample(eeg)
+                self._notify(data_bytes)
         except Exception as e:
             print("❌ Notify error:", e)
         self.timer = threading.Timer(self.interval, self._schedule)
         self.timer.start()
 
+    def _stream(self):
+        """
+        按固定间隔从环形缓冲区读取新样本，每 packet_samples 个样本打成一个通知
+
+        每次只读取整包数量的样本，不足一包的留到下一次推送，因此最多多延迟一个间隔。
+        推送按绝对时间排期，打包和发送的耗时不会累积成漂移。
+        """
+        set_thread_affinity(self.io_cpus)
+        reader = self.ring.reader()
+        size = self.packet_samples
+        t0 = None
+        next_time = time.monotonic()
+        while not self._stop.is_set():
+            n = min(reader.available() // size, self.max_packets) * size
+            if n:
+                data, timestamps, seqs = reader.read(max_n=n, with_seq=True)
+                if t0 is None:
+                    t0 = float(timestamps[0])
+                # 采集丢样本时序号不连续，在断点处另起一包，保证包内样本的序号依次加一
+                breaks = (np.flatnonzero(np.diff(seqs) != 1) + 1).tolist()
+                try:
+                    for run_start, run_end in zip([0] + breaks, breaks + [len(data)]):
+                        for start in range(run_start, run_end, size):
+                            end = min(start + size, run_end)
+                            timestamp_us = (timestamps[start] - t0) * 1e6
+                            self._notify(pack_packet(seqs[start], timestamp_us, data[start:end]))
+                            self.packets += 1
+                            self.samples_sent += end - start
+                except Exception as e:
+                    print("❌ Notify error:", e)
+
+            next_time += self.interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                # 落后超过一个间隔时重新排期，由 max_packets 逐步追上
+                next_time = time.monotonic()
+        if reader.overruns:
+            print(f"⚠️ BLE 推送落后，{reader.overruns} 个样本被覆盖")
+
     def stop(self):
+        self._stop.set()
         if self.timer:
             self.timer.cancel()
-        self.spi.close()
-        self.spi_2.close()
+        if self.streamer and self.streamer is not threading.current_thread():
+            self.streamer.join(timeout=1.0)
+        if self.packets:
+            print(f"📦 已推送 {self.packets} 个通知, {self.samples_sent} 个样本")
+        if self.acquisition:
+            self.acquisition.stop()
+        self.device.close()
         print("🛑 BLE 推送已停止")
 
     def on_connect(self):
@@ -195,8 +266,17 @@ class EEGRecorderBLE:
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="通过 BLE 推送 EEG 数据")
+    parser.add_argument("--mode", choices=BLE_MODES, default="latest",
+                        help="latest: 每次推送最新的一个样本; stream: 按 MTU 打包推送全部样本")
+    parser.add_argument("--interval-ms", type=float, help="推送间隔，默认 latest 200 ms、stream 20 ms")
+    parser.add_argument("--mtu", type=int, default=DEFAULT_MTU, help="协商后的 ATT MTU (stream 模式)")
+    parser.add_argument("--daisy", action="store_true", help="两片 ADS1299 菊花链模式")
+    args = parser.parse_args()
     try:
-        ble = EEGRecorderBLE()
+        ble = EEGRecorderBLE(args.interval_ms, daisy=args.daisy, mode=args.mode, mtu=args.mtu)
         ble.start()
         while True:
             time.sleep(1)
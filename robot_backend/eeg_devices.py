@@ -0,0 +1,298 @@
+import time
+from datetime import timedelta
+
+import numpy as np
+
+from ads1299 import (DAISY_CHIPS, DAISY_FRAME_SIZE, FRAME_SIZE, SAMPLE_RATE,
+                     decode_daisy_frames, encode_frames, initialize_chips, uv_to_codes)
+from archive import ArchiveReader, is_archive
+from recorder import is_recording, open_recording
+
+# ADS1299 DRDY 引脚 (低电平有效，下降沿表示一帧新数据就绪)
+DRDY_PIN = 24
+CS_PIN = 19
+
+
+class EEGDevice:
+    """
+    采集后端接口
+
+    每个样本是两片 ADS1299 各一帧 (共 DAISY_FRAME_SIZE 字节) 首尾相接的原始数据，
+    由 AcquisitionThread 统一解码。
+    """
+
+    sample_rate = SAMPLE_RATE
+    channels = DAISY_CHIPS * 8
+
+    def start(self):
+        pass
+
+    def wait_drdy(self, timeout):
+        """
+        等待下一个 DRDY
+
+        Returns:
+            自上次调用以来出现的 DRDY 次数，0 表示超时
+        """
+        raise NotImplementedError
+
+    def read_frame(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class HardwareDevice(EEGDevice):
+    """
+    通过 spidev / gpiod 连接的两片 ADS1299
+
+    Args:
+        daisy: 两片芯片按菊花链连接，一次 54 字节传输读出 16 通道
+        toggle_cs: 读取第二片芯片时是否拉低 CS_PIN
+        drdy_pin: DRDY 所在的 GPIO
+    """
+
+    def __init__(self, daisy=False, toggle_cs=True, drdy_pin=DRDY_PIN, max_speed_hz=4000000):
+        # 只有真正使用硬件时才需要这两个库
+        import gpiod
+        import spidev
+
+        self.daisy = daisy
+        self.toggle_cs = toggle_cs
+
+        self.spi_devices = []
+        for cs in ([0] if daisy else [0, 1]):
+            dev = spidev.SpiDev()
+            dev.open(0, cs)
+            dev.max_speed_hz = max_speed_hz
+            dev.lsbfirst = False
+            dev.mode = 0b01
+            dev.bits_per_word = 8
+            self.spi_devices.append(dev)
+
+        chip = gpiod.chip("0")
+        self.cs_line = chip.get_line(CS_PIN)
+        cs_line_out = gpiod.line_request()
+        cs_line_out.consumer = "SPI_CS"
+        cs_line_out.request_type = gpiod.line_request.DIRECTION_OUTPUT
+        self.cs_line.request(cs_line_out)
+        self.cs_line.set_value(1)
+
+        self.drdy_line = chip.get_line(drdy_pin)
+        drdy_req = gpiod.line_request()
+        drdy_req.consumer = "ADS1299_DRDY"
+        drdy_req.request_type = gpiod.line_request.EVENT_FALLING_EDGE
+        self.drdy_line.request(drdy_req)
+
+    def start(self):
+        # 菊花链模式下两片芯片共用 spi 的 CS，命令和寄存器写入同时作用于两片
+        initialize_chips(self.spi_devices)
+
+    def wait_drdy(self, timeout):
+        if not self.drdy_line.event_wait(timedelta(seconds=timeout)):
+            return 0
+        # 一次取出所有积压的边沿事件，避免同一帧被重复读取
+        return len(self.drdy_line.event_read_multiple())
+
+    def read_frame(self):
+        if self.daisy:
+            return self.spi_devices[0].xfer2([0x00] * DAISY_FRAME_SIZE)
+
+        spi, spi_2 = self.spi_devices
+        data_1 = spi.readbytes(FRAME_SIZE)
+        if self.toggle_cs:
+            self.cs_line.set_value(0)
+        data_2 = spi_2.readbytes(FRAME_SIZE)
+        if self.toggle_cs:
+            self.cs_line.set_value(1)
+        return data_1 + data_2
+
+    def close(self):
+        for dev in self.spi_devices:
+            dev.close()
+
+
+class _PacedDevice(EEGDevice):
+    """按 sample_rate 模拟 DRDY 节拍；realtime=False 时不等待，尽可能快地输出"""
+
+    def __init__(self, sample_rate, realtime):
+        self.sample_rate = sample_rate
+        self.realtime = realtime
+        self._next_time = None
+
+    def start(self):
+        self._next_time = time.monotonic()
+
+    def wait_drdy(self, timeout):
+        if not self.realtime:
+            return 1
+        if self._next_time is None:
+            self.start()
+
+        period = 1.0 / self.sample_rate
+        delay = self._next_time - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return 0
+        if delay > 0:
+            time.sleep(delay)
+
+        # 和真实芯片一样，读取落后时 DRDY 不会等待，错过的节拍一并返回
+        ready = 1 + max(0, int((time.monotonic() - self._next_time) / period))
+        self._next_time += ready * period
+        return ready
+
+
+class SyntheticDevice(_PacedDevice):
+    """
+    ADS1299 模拟器，按设定速率输出编码正确的原始帧
+
+    每个通道是不同相位的 alpha 节律正弦叠加工频干扰和高斯噪声。
+
+    Args:
+        sample_rate: 输出速率 (样本/秒)
+        realtime: False 时不等待，尽可能快地输出
+        amplitude_uv: alpha 节律幅值 (µV)
+        noise_uv: 高斯噪声标准差 (µV)
+        mains_hz: 工频干扰频率
+        block: 每次批量生成的样本数
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, realtime=True, amplitude_uv=50.0, noise_uv=5.0,
+                 mains_hz=50.0, seed=None, block=SAMPLE_RATE):
+        super(SyntheticDevice, self).__init__(sample_rate, realtime)
+        self.amplitude_uv = amplitude_uv
+        self.noise_uv = noise_uv
+        self.mains_hz = mains_hz
+        self.block = block
+        self._rng = np.random.default_rng(seed)
+        self._phase = np.linspace(0, np.pi, self.channels, dtype=np.float64)
+        self._alpha_hz = 8.0 + 4.0 * self._rng.random(self.channels)
+        self._generated = 0
+        self._frames = memoryview(b'')
+        self._offset = 0
+
+    def _generate(self):
+        t = (self._generated + np.arange(self.block))[:, None] / self.sample_rate
+        samples = (self.amplitude_uv * np.sin(2 * np.pi * self._alpha_hz * t + self._phase)
+                   + 0.2 * self.amplitude_uv * np.sin(2 * np.pi * self.mains_hz * t)
+                   + self._rng.normal(0.0, self.noise_uv, (self.block, self.channels)))
+        self._generated += self.block
+        self._frames = memoryview(encode_frames(uv_to_codes(samples)))
+        self._offset = 0
+
+    def read_frame(self):
+        if self._offset >= len(self._frames):
+            self._generate()
+        frame = self._frames[self._offset:self._offset + DAISY_FRAME_SIZE]
+        self._offset += DAISY_FRAME_SIZE
+        return frame
+
+
+class ReplayDevice(_PacedDevice):
+    """
+    回放录制的数据
+
+    Args:
+        source: SessionRecorder 记录文件、ArchiveWriter 归档文件或原始帧文件的路径、
+            原始帧 bytes，或形状 (n, 16) 的 µV 数组
+        sample_rate: 回放速率 (样本/秒)
+        realtime: False 时不等待，尽可能快地输出
+        loop: 回放结束后是否从头开始
+        block: µV 数据每次批量编码的样本数
+    """
+
+    def __init__(self, source, sample_rate=SAMPLE_RATE, realtime=True, loop=False, block=SAMPLE_RATE):
+        super(ReplayDevice, self).__init__(sample_rate, realtime)
+        self.loop = loop
+        self.block = block
+        self._samples = None
+        self._archive = None
+        self._frames = None
+
+        if isinstance(source, str):
+            if is_archive(source):
+                # 归档保存的是原始 ADC 码，按块解压后直接编码，不经过 µV 换算
+                self._archive = ArchiveReader(source)
+                self._samples = self._archive
+            elif is_recording(source):
+                self._samples = open_recording(source).data
+            else:
+                with open(source, 'rb') as f:
+                    self._frames = memoryview(f.read())
+        elif isinstance(source, np.ndarray):
+            self._samples = source
+        else:
+            self._frames = memoryview(source)
+
+        if self._frames is not None:
+            if len(self._frames) % DAISY_FRAME_SIZE:
+                raise ValueError(f"回放数据长度 {len(self._frames)} 不是样本长度 {DAISY_FRAME_SIZE} 的整数倍")
+            self.n_samples = len(self._frames) // DAISY_FRAME_SIZE
+        else:
+            self.n_samples = len(self._samples)
+
+        self._position = 0
+        self._block_start = None
+        self._block = None
+
+    def wait_drdy(self, timeout):
+        if self._position >= self.n_samples:
+            if not self.loop:
+                raise EOFError("回放结束")
+            self._position = 0
+        return super(ReplayDevice, self).wait_drdy(timeout)
+
+    def read_frame(self):
+        i = self._position
+        self._position += 1
+        if self._frames is not None:
+            return self._frames[i * DAISY_FRAME_SIZE:(i + 1) * DAISY_FRAME_SIZE]
+
+        # 按块重新编码为原始帧，避免一次性编码整段记录
+        if self._block is None or not self._block_start <= i < self._block_start + self.block:
+            self._block_start = i
+            if self._archive is not None:
+                codes = self._archive.codes(i, i + self.block)
+            else:
+                codes = uv_to_codes(self._samples[i:i + self.block])
+            self._block = memoryview(encode_frames(codes))
+        offset = (i - self._block_start) * DAISY_FRAME_SIZE
+        return self._block[offset:offset + DAISY_FRAME_SIZE]
+
+
+def load_session(source):
+    """
+    把记录文件、归档文件或原始帧文件整段读为 µV
+
+    Returns:
+        形状 (n, 16) 的 float32 数组 (记录文件返回只读 memmap，不拷贝)
+    """
+    if is_archive(source):
+        archive = ArchiveReader(source)
+        try:
+            return archive[:]
+        finally:
+            archive.close()
+    if is_recording(source):
+        return open_recording(source).data
+    with open(source, 'rb') as f:
+        return decode_daisy_frames(f.read())
+
+
+def open_device(backend="spi", **kwargs):
+    """
+    按名称创建采集后端
+
+    Args:
+        backend: "spi" (真实硬件)、"synthetic" (模拟器) 或 "replay" (回放)
+        kwargs: 传给对应后端的参数
+    """
+    if backend == "spi":
+        return HardwareDevice(**kwargs)
+    elif backend == "synthetic":
+        return SyntheticDevice(**kwargs)
+    elif backend == "replay":
+        return ReplayDevice(**kwargs)
+    raise ValueError(f"不支持的采集后端: {backend}")
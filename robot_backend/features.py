@@ -0,0 +1,122 @@
+import numpy as np
+
+from ads1299 import SAMPLE_RATE
+
+# 频段名称和范围 (Hz)，特征按此顺序排列
+BANDS = (
+    ('delta', 1.0, 4.0),
+    ('theta', 4.0, 8.0),
+    ('alpha', 8.0, 13.0),
+    ('beta', 13.0, 30.0),
+    ('gamma', 30.0, 45.0),
+)
+
+
+class BandPowerExtractor:
+    """
+    滑动窗口的逐通道频段功率
+
+    窗口由 n_segments 个每隔 hop 个样本开始、长 segment_size 的加窗分段组成
+    (Welch 方法)。每凑满一个 hop 只对最新的一个分段做 FFT，得到的各频段功率放入
+    环形表并更新累加和，窗口内其余分段的结果直接复用，不重新计算整窗 FFT。
+
+    features() 返回形状固定为 (n_bands, channels) 的 float32 数组，
+    torch.from_numpy(features).unsqueeze(0) 即为 in_channels=n_bands 的 StressCNN 式输入
+    (batch, n_bands, 16)。
+
+    Args:
+        sample_rate: 采样率
+        channels: 通道数
+        segment_size: 每个分段的样本数，决定频率分辨率 (sample_rate / segment_size)
+        hop: 相邻分段的间隔，也是特征的更新间隔，不大于 segment_size
+        n_segments: 窗口包含的分段数
+        bands: (名称, 下限, 上限) 的序列
+        log: 为 True 时输出 log10 功率 (µV²)
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, channels=16, segment_size=SAMPLE_RATE, hop=SAMPLE_RATE // 4,
+                 n_segments=8, bands=BANDS, log=True):
+        if not 0 < hop <= segment_size:
+            raise ValueError(f"hop ({hop}) 须在 1 和 segment_size ({segment_size}) 之间")
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.segment_size = segment_size
+        self.hop = hop
+        self.n_segments = n_segments
+        self.bands = tuple(bands)
+        self.log = log
+        self.window_size = (n_segments - 1) * hop + segment_size
+
+        # Hann 窗，按单边功率谱密度归一化，频段功率 = 频段内 PSD 之和 × 频率间隔
+        taper = np.hanning(segment_size)
+        self._taper = taper[:, None]
+        freqs = np.fft.rfftfreq(segment_size, 1.0 / sample_rate)
+        df = sample_rate / segment_size
+        scale = 2.0 / (sample_rate * np.sum(taper ** 2))
+        self._band_matrix = np.zeros((len(freqs), len(self.bands)))
+        for j, (_, low, high) in enumerate(self.bands):
+            self._band_matrix[(freqs >= low) & (freqs < high), j] = scale * df
+        self._offsets = np.arange(segment_size)
+
+        self._tail = np.zeros((segment_size - hop, channels))
+        self._pending = np.zeros((0, channels))
+        self._powers = np.zeros((n_segments, channels, len(self.bands)))
+        self._sum = np.zeros((channels, len(self.bands)))
+        self._index = 0
+        self.samples_seen = 0
+        self.updates = 0
+
+    @property
+    def band_names(self):
+        return [name for name, _, _ in self.bands]
+
+    @property
+    def ready(self):
+        """窗口是否已被真实数据填满"""
+        return self.samples_seen >= self.window_size
+
+    def update(self, samples):
+        """
+        输入一块新样本 (n, channels)
+
+        Returns:
+            本次新完成的分段数，为 0 时特征没有变化
+        """
+        pending = np.concatenate([self._pending, np.asarray(samples, dtype=np.float64)])
+        k = len(pending) // self.hop
+        self.samples_seen += len(samples)
+        if k == 0:
+            self._pending = pending
+            return 0
+
+        # 第 j 个新分段 = stream[j*hop : j*hop + segment_size]，所有新分段一次批量 FFT
+        stream = np.concatenate([self._tail, pending[:k * self.hop]])
+        segments = stream[(np.arange(k) * self.hop)[:, None] + self._offsets]
+        spectra = np.fft.rfft(segments * self._taper, axis=1)
+        psd = spectra.real ** 2 + spectra.imag ** 2
+        powers = np.einsum('kfc,fb->kcb', psd, self._band_matrix)
+
+        for p in powers[-self.n_segments:]:
+            self._sum += p - self._powers[self._index]
+            self._powers[self._index] = p
+            self._index = (self._index + 1) % self.n_segments
+            if self._index == 0:
+                # 每转一圈重新求和一次，消除增量更新的浮点累积误差
+                self._sum = self._powers.sum(axis=0)
+
+        if len(self._tail):
+            self._tail = stream[-len(self._tail):]
+        self._pending = pending[k * self.hop:]
+        self.updates += k
+        return k
+
+    def features(self):
+        """
+        Returns:
+            形状 (n_bands, channels) 的 float32 数组，窗口未填满时只在已有分段上平均
+        """
+        count = min(self.updates, self.n_segments)
+        power = self._sum.T / max(count, 1)
+        if self.log:
+            power = np.log10(np.maximum(power, 1e-12))
+        return power.astype(np.float32)
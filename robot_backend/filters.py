@@ -0,0 +1,86 @@
+import numpy as np
+from scipy import signal
+
+from ads1299 import SAMPLE_RATE
+
+
+def design_sos(sample_rate=SAMPLE_RATE, bandpass=(1.0, 45.0), order=4, notch_hz=50.0, notch_q=30.0):
+    """
+    设计带通 + 工频陷波的级联二阶节 (SOS) 系数
+
+    Args:
+        sample_rate: 采样率
+        bandpass: (低截止, 高截止) Hz，None 表示不做带通
+        order: Butterworth 带通阶数
+        notch_hz: 陷波频率 (50 或 60)，也可以是多个频率 (例如包含谐波)，None 表示不做陷波
+        notch_q: 陷波品质因数，越大陷波越窄
+
+    Returns:
+        形状 (n_sections, 6) 的 float64 数组
+    """
+    sections = []
+    if bandpass is not None:
+        sections.append(signal.butter(order, bandpass, btype='bandpass', fs=sample_rate, output='sos'))
+    if notch_hz is not None:
+        for f0 in np.atleast_1d(notch_hz):
+            if f0 < sample_rate / 2:
+                b, a = signal.iirnotch(f0, notch_q, fs=sample_rate)
+                sections.append(signal.tf2sos(b, a))
+    if not sections:
+        raise ValueError("带通和陷波至少需要指定一个")
+    return np.vstack(sections)
+
+
+class StreamingFilter:
+    """
+    16 通道流式 IIR 滤波器
+
+    所有通道共用一组 SOS 系数，每次 process() 对一整块 (n, channels) 样本调用一次
+    scipy.signal.sosfilt，滤波器状态在块之间保持，因此分块处理的结果与对整段数据
+    一次滤波完全一致。
+
+    第一块到来时按首个样本初始化为稳态 (相当于信号之前一直保持该值)，
+    避免电极直流偏置在开始时产生很长的瞬态。
+
+    Args:
+        channels: 通道数
+        其余参数见 design_sos
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, channels=16, bandpass=(1.0, 45.0), order=4,
+                 notch_hz=50.0, notch_q=30.0):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sos = design_sos(sample_rate, bandpass, order, notch_hz, notch_q)
+        self._zi_unit = signal.sosfilt_zi(self.sos)
+        self._zi = None
+
+    def reset(self, x0=None):
+        """清除滤波器状态；给定 x0 时按该样本初始化为稳态，否则在下一块到来时初始化"""
+        if x0 is None:
+            self._zi = None
+        else:
+            self._zi = self._zi_unit[:, :, None] * np.asarray(x0, dtype=np.float64)
+
+    def process(self, samples):
+        """
+        滤波一块样本
+
+        Args:
+            samples: 形状 (n, channels) 的数组
+
+        Returns:
+            形状 (n, channels) 的 float32 数组
+        """
+        if len(samples) == 0:
+            return np.zeros((0, self.channels), dtype=np.float32)
+        if self._zi is None:
+            self.reset(samples[0])
+        out, self._zi = signal.sosfilt(self.sos, samples, axis=0, zi=self._zi)
+        return out.astype(np.float32)
+
+
+def filter_offline(samples, **kwargs):
+    """对整段记录做与 StreamingFilter 相同的滤波，参数见 StreamingFilter"""
+    samples = np.asarray(samples)
+    return StreamingFilter(channels=samples.shape[1], **kwargs).process(samples)
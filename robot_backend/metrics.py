@@ -0,0 +1,196 @@
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Prometheus 文本格式的 Content-Type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 延迟直方图的桶上限 (秒)，从 SPI 读取 (几十微秒) 到 HTTP 请求 (几百毫秒)
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5)
+
+
+class Histogram:
+    """
+    固定桶的直方图，observe 只做一次二分查找和三次加法，可以在每次迭代中调用
+
+    Args:
+        name: 指标名
+        help: 说明
+        buckets: 递增的桶上限，另有一个 +Inf 桶
+        labels: 标签 dict
+    """
+
+    def __init__(self, name, help="", buckets=LATENCY_BUCKETS, labels=None):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = dict(labels or {})
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """with hist.time(): ... 记录代码块的耗时"""
+        return _Timer(self)
+
+    def quantile(self, q):
+        """按桶估计分位数 (返回所在桶的上限，落在 +Inf 桶时返回 inf)"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self.count
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        for i, n in enumerate(counts):
+            cumulative += n
+            if cumulative >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def render(self):
+        """Prometheus 文本格式的 _bucket / _sum / _count 行"""
+        with self._lock:
+            counts = list(self._counts)
+            total, value_sum = self.count, self.sum
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            cumulative += n
+            le = "+Inf" if bound == float('inf') else repr(bound)
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, le=le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labels)} {value_sum!r}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels)} {total}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self._start)
+        return False
+
+
+def _format_labels(labels, **extra):
+    items = dict(labels, **extra)
+    if not items:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in items.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(items, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """同名、同标签的直方图只创建一次；render 输出全部指标"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, help="", buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = self._metrics[key] = Histogram(name, help, buckets, labels)
+        return metric
+
+    def histograms(self, name=None):
+        with self._lock:
+            return [m for (n, _), m in self._metrics.items() if name is None or n == name]
+
+    def render(self):
+        lines = []
+        described = set()
+        for metric in sorted(self.histograms(), key=lambda m: m.name):
+            if metric.name not in described:
+                described.add(metric.name)
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} histogram")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 进程内共享的默认注册表
+METRICS = MetricsRegistry()
+
+
+class StageTimer:
+    """
+    记录一次迭代中依次执行的各阶段耗时 (单调时钟)
+
+    用法: timer.start() 后每个阶段结束时调用 timer.mark(阶段名)，
+    记录到 registry 中 name{stage="阶段名"} 直方图。
+
+    Args:
+        name: 指标名，例如 "eeg_stage_seconds"
+        stages: 阶段名列表
+        help: 说明
+    """
+
+    def __init__(self, name, stages, help="", registry=METRICS):
+        self.histograms = {stage: registry.histogram(name, help, stage=stage) for stage in stages}
+        self._last = None
+
+    def start(self):
+        self._last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.histograms[stage].observe(now - self._last)
+        self._last = now
+
+    def summary(self):
+        """各阶段的次数、平均值和 p95 (毫秒，按桶估计)"""
+        out = {}
+        for stage, h in self.histograms.items():
+            if h.count:
+                out[stage] = {'count': h.count, 'mean_ms': 1000.0 * h.mean(), 'p95_ms': 1000.0 * h.quantile(0.95)}
+        return out
+
+
+def serve_metrics(port, host="0.0.0.0", registry=METRICS):
+    """
+    在后台线程中提供 GET /metrics (没有 Flask 的进程，例如实时预测)
+
+    Returns:
+        ThreadingHTTPServer，调用 shutdown() 停止
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # 抓取请求很频繁，不打印访问日志
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,196 @@
+import mmap
+import os
+import struct
+import threading
+
+import numpy as np
+
+from ads1299 import SAMPLE_RATE, UV_PER_CODE
+
+# 文件头: magic, 版本, 通道数, 概率数, 保留, 采样率, 增益, µV/码, 记录数
+MAGIC = b"EEGREC01"
+VERSION = 1
+HEADER = struct.Struct("<8sHHHHdddq")
+HEADER_SIZE = 64
+
+
+def record_dtype(channels, n_probs):
+    return np.dtype([
+        ('timestamp', '<f8'),
+        ('data', '<f4', (channels,)),
+        ('probs', '<f4', (n_probs,)),
+    ])
+
+
+class SessionRecorder:
+    """
+    追加写入的内存映射会话记录器
+
+    每条记录是 (单调时间戳, 16 通道 µV, 模型概率)。文件按 grow 条记录为单位
+    预先扩展并映射，写入只是对映射区域的切片赋值，不产生 Python 对象。
+    文件头里的记录数随每次 append 更新，异常退出后记录仍可读取。
+    尚未打分的样本概率为 NaN。
+
+    Args:
+        path: 记录文件路径
+        channels: 通道数
+        sample_rate: 采样率，写入文件头
+        n_probs: 每个样本保存的概率个数
+        gain: ADS1299 PGA 增益，写入文件头
+        grow: 每次扩展文件的记录数
+    """
+
+    def __init__(self, path, channels=16, sample_rate=SAMPLE_RATE, n_probs=1, gain=1, grow=60 * SAMPLE_RATE):
+        self.path = path
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.n_probs = n_probs
+        self.gain = gain
+        self.grow = grow
+        self.dtype = record_dtype(channels, n_probs)
+        self.n_records = 0
+        self.first_seq = None
+        self._capacity = 0
+        self._mmap = None
+        self._records = None
+        self._count = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+        self._file = open(path, 'w+b')
+        self._file.write(self._header().ljust(HEADER_SIZE, b'\0'))
+        self._ensure_capacity(grow)
+
+    def _header(self):
+        return HEADER.pack(MAGIC, VERSION, self.channels, self.n_probs, 0,
+                           self.sample_rate, self.gain, UV_PER_CODE, self.n_records)
+
+    def _ensure_capacity(self, n):
+        if n <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < n:
+            capacity += self.grow
+
+        # 重新映射前必须释放所有指向旧映射的数组
+        self._records = None
+        self._count = None
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.truncate(HEADER_SIZE + capacity * self.dtype.itemsize)
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self._records = np.ndarray((capacity,), dtype=self.dtype, buffer=self._mmap, offset=HEADER_SIZE)
+        self._count = np.ndarray((1,), dtype='<i8', buffer=self._mmap, offset=HEADER.size - 8)
+        self._records['probs'][self._capacity:] = np.nan
+        self._capacity = capacity
+
+    def append(self, samples, timestamps):
+        """追加一批样本，返回第一条的记录号"""
+        n = len(samples)
+        with self._lock:
+            start = self.n_records
+            self._ensure_capacity(start + n)
+            self._records['timestamp'][start:start + n] = timestamps
+            self._records['data'][start:start + n] = samples
+            self.n_records = start + n
+            self._count[0] = self.n_records
+        return start
+
+    def set_probabilities(self, rows, probs):
+        """写入第 rows 条 (记录号或记录号数组) 记录的模型概率 (这些行可以尚未被 append)"""
+        rows = np.asarray(rows)
+        with self._lock:
+            self._ensure_capacity(int(rows.max()) + 1)
+            self._records['probs'][rows] = np.reshape(probs, rows.shape + (self.n_probs,))
+
+    def record_from(self, ring, timeout=0.5):
+        """
+        启动后台线程，从环形缓冲区的独立读游标持续记录
+
+        记录号 = 环形缓冲区序号 - first_seq
+        """
+        reader = ring.reader()
+        self.first_seq = reader.cursor
+
+        def run():
+            while not self._stop_event.is_set():
+                samples, timestamps = reader.read(timeout=timeout)
+                if len(samples):
+                    self.append(samples, timestamps)
+
+        self._thread = threading.Thread(target=run, name="session-recorder", daemon=True)
+        self._thread.start()
+        return reader
+
+    def flush(self):
+        with self._lock:
+            self._mmap[:HEADER.size] = self._header()
+            self._mmap.flush()
+
+    def close(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        with self._lock:
+            self._records = None
+            self._count = None
+            self._mmap.close()
+            self._file.truncate(HEADER_SIZE + self.n_records * self.dtype.itemsize)
+            self._file.close()
+
+
+class Recording:
+    """open_recording 的返回值，records 为只读 memmap"""
+
+    def __init__(self, path, channels, n_probs, sample_rate, gain, uv_per_code, records):
+        self.path = path
+        self.channels = channels
+        self.n_probs = n_probs
+        self.sample_rate = sample_rate
+        self.gain = gain
+        self.uv_per_code = uv_per_code
+        self.records = records
+
+    @property
+    def timestamps(self):
+        return self.records['timestamp']
+
+    @property
+    def data(self):
+        return self.records['data']
+
+    @property
+    def probs(self):
+        return self.records['probs']
+
+    def __len__(self):
+        return len(self.records)
+
+
+def is_recording(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def open_recording(path):
+    """
+    以 memmap 方式打开记录文件，不拷贝数据
+
+    也可以打开正在写入或异常退出、未 close 的记录，只映射文件头中已提交的部分。
+    """
+    with open(path, 'rb') as f:
+        magic, version, channels, n_probs, _, sample_rate, gain, uv_per_code, n_records = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{path} 不是 EEG 记录文件")
+    if version != VERSION:
+        raise ValueError(f"不支持的记录文件版本: {version}")
+
+    dtype = record_dtype(channels, n_probs)
+    n_records = min(n_records, (os.path.getsize(path) - HEADER_SIZE) // dtype.itemsize)
+    if n_records == 0:
+        records = np.zeros(0, dtype=dtype)
+    else:
+        records = np.memmap(path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(n_records,))
+    return Recording(path, channels, n_probs, sample_rate, gain, uv_per_code, records)
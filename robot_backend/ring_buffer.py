@@ -0,0 +1,225 @@
+import threading
+import time
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# 缓冲区内存布局: 元数据 (head, capacity, channels) | 采集统计 | 数据 | 时间戳 | 序列号
+META_SIZE = 64
+STATS_SIZE = 64
+HEADER_SIZE = META_SIZE + STATS_SIZE
+
+
+class EEGRingBuffer:
+    """
+    预分配的 float32 环形缓冲区，单个采集线程写入，多个读者读取
+
+    数据按镜像方式存两份 (2 × capacity 行)，任意不超过 capacity 的窗口
+    在内存中都是连续的，因此 window() 和 RingReader.read() 都直接返回视图，
+    不做拷贝。视图在写入者再写满 capacity 个样本之前有效，需要长期持有的
+    读者应自行 copy()。
+
+    每个样本除时间戳外还带有采集端的序列号，序列号不连续说明采集时丢了帧。
+    stats 是留给 acquisition.AcquisitionStats 的一小块 float64 空间，
+    放在缓冲区内部使得共享内存模式下其它进程也能读到采集统计。
+
+    Args:
+        capacity: 最多保留的样本数
+        channels: 每个样本的通道数
+        buffer: 可选的外部内存 (例如共享内存)，大小至少为 nbytes(capacity, channels)
+    """
+
+    def __init__(self, capacity, channels=16, buffer=None):
+        if buffer is None:
+            buffer = bytearray(self.nbytes(capacity, channels))
+        self.capacity = capacity
+        self.channels = channels
+        self._meta = np.ndarray((3,), dtype=np.int64, buffer=buffer)
+        self.stats = np.ndarray((STATS_SIZE // 8,), dtype=np.float64, buffer=buffer, offset=META_SIZE)
+        self._data = np.ndarray((2 * capacity, channels), dtype=np.float32, buffer=buffer, offset=HEADER_SIZE)
+        self._timestamps = np.ndarray((2 * capacity,), dtype=np.float64, buffer=buffer,
+                                      offset=HEADER_SIZE + self._data.nbytes)
+        self._seqs = np.ndarray((2 * capacity,), dtype=np.int64, buffer=buffer,
+                                offset=HEADER_SIZE + self._data.nbytes + self._timestamps.nbytes)
+        # 已写入的样本总数，同时是下一个样本的序号
+        self._head = self._meta[0:1]
+        self._meta[1] = capacity
+        self._meta[2] = channels
+        self._cond = threading.Condition()
+        self._readers = weakref.WeakSet()
+
+    @staticmethod
+    def nbytes(capacity, channels=16):
+        return HEADER_SIZE + 2 * capacity * (channels * 4 + 8 + 8)
+
+    @property
+    def head(self):
+        return int(self._head[0])
+
+    def write(self, sample, timestamp, seq=None):
+        """写入一个样本，seq 默认为缓冲区内的序号"""
+        head = int(self._head[0])
+        i = head % self.capacity
+        if seq is None:
+            seq = head
+        self._data[i] = sample
+        self._data[i + self.capacity] = sample
+        self._timestamps[i] = timestamp
+        self._timestamps[i + self.capacity] = timestamp
+        self._seqs[i] = seq
+        self._seqs[i + self.capacity] = seq
+        self._publish(head + 1)
+
+    def write_block(self, samples, timestamps, seqs=None):
+        n = len(samples)
+        head = int(self._head[0])
+        if seqs is None:
+            seqs = np.arange(head, head + n)
+        if n > self.capacity:
+            # 超出容量的部分写入后会立即被覆盖，只保留最后 capacity 个
+            head += n - self.capacity
+            samples = samples[-self.capacity:]
+            timestamps = timestamps[-self.capacity:]
+            seqs = seqs[-self.capacity:]
+            n = self.capacity
+
+        i = head % self.capacity
+        # 分别写入镜像的两半，越过缓冲区末尾的部分回绕到开头
+        for j in (i, i + self.capacity):
+            first = min(n, 2 * self.capacity - j)
+            self._data[j:j + first] = samples[:first]
+            self._timestamps[j:j + first] = timestamps[:first]
+            self._seqs[j:j + first] = seqs[:first]
+            self._data[:n - first] = samples[first:]
+            self._timestamps[:n - first] = timestamps[first:]
+            self._seqs[:n - first] = seqs[first:]
+        self._publish(head + n)
+
+    def _publish(self, head):
+        with self._cond:
+            self._head[0] = head
+            self._cond.notify_all()
+
+    def wait(self, head, timeout=None):
+        """阻塞直到写入总数超过 head，返回是否有新数据"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._head[0] > head, timeout)
+
+    def window(self, n, end=None, with_seq=False):
+        """
+        返回截至序号 end (默认最新) 的最近 n 个样本
+
+        Returns:
+            (data, timestamps) 零拷贝视图，形状分别为 (n, channels) 和 (n,)；
+            with_seq=True 时再附加序列号视图
+        """
+        head = int(self._head[0])
+        if end is None:
+            end = head
+        start = end - n
+        if n > self.capacity or start < max(0, head - self.capacity) or end > head:
+            raise IndexError(f"窗口 [{start}, {end}) 不在缓冲区范围内 (head={head}, capacity={self.capacity})")
+        i = start % self.capacity
+        if with_seq:
+            return self._data[i:i + n], self._timestamps[i:i + n], self._seqs[i:i + n]
+        return self._data[i:i + n], self._timestamps[i:i + n]
+
+    def reader(self):
+        reader = RingReader(self)
+        self._readers.add(reader)
+        return reader
+
+    def overruns(self):
+        """本进程内所有读者的溢出样本总数"""
+        return sum(reader.overruns for reader in list(self._readers))
+
+
+class RingReader:
+    """
+    环形缓冲区的独立读游标
+
+    每个消费者 (推理、BLE、记录) 持有自己的游标，互不影响。
+    读者落后超过 capacity 时，被覆盖的样本计入 overruns 并跳过。
+    """
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.cursor = ring.head
+        self.overruns = 0
+
+    def available(self):
+        return self.ring.head - self.cursor
+
+    def read(self, max_n=None, timeout=None, with_seq=False):
+        """
+        读取游标之后的新样本，没有新数据时最多等待 timeout 秒
+
+        Returns:
+            (data, timestamps) 零拷贝视图，可能为空；with_seq=True 时再附加序列号视图
+        """
+        if self.available() == 0:
+            self.ring.wait(self.cursor, timeout)
+
+        while True:
+            head = self.ring.head
+            lost = head - self.cursor - self.ring.capacity
+            if lost > 0:
+                self.overruns += lost
+                self.cursor += lost
+
+            n = head - self.cursor
+            if max_n is not None:
+                n = min(n, max_n)
+            try:
+                views = self.ring.window(n, end=self.cursor + n, with_seq=with_seq)
+            except IndexError:
+                # 读取 head 之后写入者又覆盖了游标处的样本，按新的 head 重新计算溢出
+                continue
+            self.cursor += n
+            return views
+
+
+class SharedEEGRingBuffer(EEGRingBuffer):
+    """
+    位于 multiprocessing.shared_memory 中的环形缓冲区
+
+    采集进程用 create() 创建并写入，推理等进程用 attach(name) 按名称连接后
+    像普通 EEGRingBuffer 一样读取。写入者在另一个进程中，无法通过条件变量
+    通知，因此 wait() 以 poll_interval 轮询 head。
+    """
+
+    def __init__(self, shm, capacity, channels, poll_interval=0.001):
+        self._shm = shm
+        self.name = shm.name
+        self.poll_interval = poll_interval
+        super(SharedEEGRingBuffer, self).__init__(capacity, channels, buffer=shm.buf)
+
+    @classmethod
+    def create(cls, capacity, channels=16, name=None):
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls.nbytes(capacity, channels))
+        ring = cls(shm, capacity, channels)
+        ring._head[0] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        shm = shared_memory.SharedMemory(name=name)
+        capacity, channels = np.ndarray((3,), dtype=np.int64, buffer=shm.buf)[1:3].tolist()
+        return cls(shm, capacity, channels)
+
+    def wait(self, head, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._head[0] <= head:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+        return True
+
+    def close(self):
+        # 释放所有指向共享内存的数组后才能关闭
+        self._meta = self._head = self.stats = self._data = self._timestamps = self._seqs = None
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()